@@ -0,0 +1,403 @@
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import JeopardyFunctions
+from JeopardyCache import clear_cache
+from JeopardyDatabase import pool_status, read_sql, read_value
+from JeopardyFunctions import clear_game_cache, max_air_date
+from JeopardySynthetic import build_derived_tables, generate, load, start_local_database
+
+# Benchmarks the JeopardyFunctions entry points and page callbacks the way a worker runs them in steady state: the
+# per-process tables (board cube, champion stats, win probabilities, model) and cached layout data stay loaded, while
+# the per-show game cache is cleared before every call and figure caches are bypassed, so each sample pays for its
+# own queries and computation. Inputs are drawn from a seeded generator, so two runs time the same calls.
+
+search_terms = ["history", "river", "king", "opera", "world", "science", "poet"]
+
+# Sorts and filters applied to the Clue Search table
+table_sorts = ["Air Date", "Clue Value", "Category", "Number Correct"]
+table_filters = [
+    "{Clue Value} > 800",
+    "{Round} = DJ",
+    '{Category} contains "world"',
+    "{Air Date} datestartswith 2015",
+]
+
+
+class Inputs:
+    """
+    Draws realistic arguments (shows, champions, search terms and date ranges) from the archive in the database.
+    """
+
+    def __init__(self, seed):
+        self.rng = np.random.default_rng(seed)
+        # Shows every entry point can handle, including the win probability model and Final Jeopardy result
+        self.shows = read_sql(
+            """SELECT show_number FROM games_view
+            WHERE regular_season = true and show_number >= 3966 and winning_contestant <> 'Tied'"""
+        )["show_number"].to_numpy()
+        if len(self.shows) == 0:
+            raise ValueError(
+                "the archive has no regular season games from show 3966 on, load one with JeopardySynthetic.py "
+                "--first-show"
+            )
+        self.champions = read_sql(
+            "SELECT contestant FROM champion_stats ORDER BY winnings desc LIMIT 50"
+        )["contestant"].to_numpy()
+        # The categories Category Exploration plots, and users click, are the most frequent ones
+        self.categories = read_sql(
+            "SELECT category FROM clue_search GROUP BY category ORDER BY COUNT(*) desc LIMIT 50"
+        )["category"].to_numpy()
+        self.first_date = read_value("SELECT min(air_date) FROM games_view")
+        self.last_date = max_air_date()
+
+    def show(self):
+        return int(self.rng.choice(self.shows))
+
+    def champion(self):
+        return str(self.rng.choice(self.champions))
+
+    def term(self):
+        return str(self.rng.choice(search_terms))
+
+    def category_click(self):
+        # No click (the page's default category) half of the time, otherwise a click on a category's bar
+        if self.rng.random() < 0.5:
+            return None
+        return {"points": [{"y": str(self.rng.choice(self.categories))}]}
+
+    def table(self):
+        """
+        Output: Page, page size, sort_by and filter_query of the Clue Search table, sorted and filtered half of the
+        time each
+        """
+        sort_by = []
+        if self.rng.random() < 0.5:
+            sort_by = [
+                {
+                    "column_id": str(self.rng.choice(table_sorts)),
+                    "direction": str(self.rng.choice(["asc", "desc"])),
+                }
+            ]
+        filter_query = ""
+        if self.rng.random() < 0.5:
+            filter_query = str(self.rng.choice(table_filters))
+        return int(self.rng.integers(0, 5)), 12, sort_by, filter_query
+
+    def date_range(self):
+        # The default range of the date pickers half of the time, otherwise a random one
+        if self.rng.random() < 0.5:
+            start = datetime.date(2001, 11, 26)
+            return str(start), str(self.last_date.date())
+        days = (self.last_date - self.first_date).days
+        start, end = np.sort(self.rng.integers(0, days + 1, 2))
+        return (
+            str((self.first_date + datetime.timedelta(days=int(start))).date()),
+            str((self.first_date + datetime.timedelta(days=int(end))).date()),
+        )
+
+
+def _pages():
+    # The page modules register their callbacks with the app, so they are imported through it
+    import dash
+
+    import app  # noqa: F401
+
+    return {
+        page["module"].split(".")[-1]: sys.modules[page["module"]]
+        for page in dash.page_registry.values()
+    }
+
+
+def entry_points():
+    """
+    Output: Dictionary mapping each benchmarked entry point to its function and a function drawing its arguments
+    from an Inputs.
+    """
+    pages = _pages()
+    functions = {
+        "pivot_game": (JeopardyFunctions.pivot_game, lambda i: (i.show(),)),
+        "game_progression": (JeopardyFunctions.game_progression, lambda i: (i.show(),)),
+        "find_data": (
+            JeopardyFunctions.find_data,
+            lambda i: (str(i.rng.choice(["Clue", "Category"])), i.term(), "Contains"),
+        ),
+        "game_progression_win_probability": (
+            JeopardyFunctions.game_progression_win_probability,
+            lambda i: (i.show(),),
+        ),
+        "final_model_plot_data": (
+            JeopardyFunctions.final_model_plot_data,
+            lambda i: (i.show(),),
+        ),
+        "Games.get_data": (pages["Games"].get_data, lambda i: (i.show(),)),
+        "Champions.get_champions": (
+            pages["Champions"].get_champions,
+            lambda i: (i.champion(),),
+        ),
+        "Visualizations.plot_prob_correct": (
+            pages["Visualizations"].plot_prob_correct,
+            lambda i: i.date_range(),
+        ),
+        "Win Probability.get_data": (
+            pages["Win Probability"].get_data,
+            lambda i: (i.show(),),
+        ),
+        "Category Exploration.plot_categories": (
+            pages["Category Exploration"].plot_categories,
+            lambda i: ("", str(i.rng.choice(["Category", "Correct Response"])), 0)
+            + i.date_range(),
+        ),
+        "Category Exploration.update": (
+            pages["Category Exploration"].update,
+            lambda i: (i.category_click(), "Category") + i.date_range(),
+        ),
+        "Clue Search.filter_clues": (
+            pages["Clue Search"].filter_clues,
+            lambda i: (i.term(), "Category", "Contains"),
+        ),
+        # page_clues itself reads the callback context, so its body is timed
+        "Clue Search.page_clues": (
+            pages["Clue Search"].clue_page,
+            lambda i: (i.term(), str(i.rng.choice(["Clue", "Category"])), "Contains")
+            + i.table(),
+        ),
+    }
+    # Callbacks cached with cached_figures are timed without their cache
+    return {
+        name: (getattr(function, "__wrapped__", function), arguments)
+        for name, (function, arguments) in functions.items()
+    }
+
+
+def _percentile(values, q):
+    return round(float(np.percentile(values, q)), 2)
+
+
+def benchmark(function, arguments, inputs, samples, memory_samples):
+    """
+    Inputs: Function to time, function drawing its arguments from inputs, number of timed calls and number of calls
+    traced with tracemalloc (traced separately, as tracing slows the calls down)
+
+    Output: Dictionary with the latency percentiles in milliseconds, the peak memory in KiB and the average number of
+    queries of one call
+    """
+    function(*arguments(inputs))
+
+    latencies, queries = [], []
+    for _ in range(samples):
+        args = arguments(inputs)
+        clear_game_cache()
+        before = pool_status()["queries"]
+        start = time.perf_counter()
+        function(*args)
+        latencies.append(1000 * (time.perf_counter() - start))
+        queries.append(pool_status()["queries"] - before)
+
+    peaks = []
+    for _ in range(memory_samples):
+        args = arguments(inputs)
+        clear_game_cache()
+        tracemalloc.start()
+        function(*args)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        "samples": samples,
+        "mean_ms": round(float(np.mean(latencies)), 2),
+        "p50_ms": _percentile(latencies, 50),
+        "p90_ms": _percentile(latencies, 90),
+        "p99_ms": _percentile(latencies, 99),
+        "max_ms": round(max(latencies), 2),
+        "peak_kib": round(max(peaks) / 1024, 1) if peaks else None,
+        "queries": round(float(np.mean(queries)), 2),
+    }
+
+
+def load_archive(shows, seed):
+    # Archives start late enough to cover the Win Probability shows and the default Visualizations range
+    load(generate(shows, seed, first_show=max(1, 8500 - shows)))
+    build_derived_tables()
+    clear_cache()
+    clear_game_cache()
+
+
+def run(names, seed, samples, memory_samples):
+    """
+    Output: Dictionary describing the archive in the database and the results of every entry point in names
+    """
+    functions = entry_points()
+    results = {
+        "shows": read_value("SELECT count(*) FROM games_view"),
+        "clues": read_value("SELECT count(*) FROM clues_view"),
+        "entry_points": {},
+    }
+    for name in names:
+        function, arguments = functions[name]
+        # Every entry point draws from its own generator, so selecting a subset does not change their inputs
+        inputs = Inputs([seed, list(functions).index(name)])
+        results["entry_points"][name] = benchmark(
+            function, arguments, inputs, samples, memory_samples
+        )
+        print_row(name, results["entry_points"][name])
+    return results
+
+
+def print_row(name, result):
+    print(
+        f"{name:<40}{result['p50_ms']:>10.1f}{result['p90_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+        f"{result['peak_kib'] or 0:>12.0f}{result['queries']:>9.1f}"
+    )
+
+
+def print_header(title):
+    print(f"\n{title}")
+    print(
+        f"{'entry point':<40}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'peak KiB':>12}{'queries':>9}"
+    )
+
+
+def compare(previous, current, max_regression):
+    """
+    Prints the ratio of every shared result of two runs (current / previous) and returns the list of entry points
+    whose p50 latency, peak memory or query count grew by more than max_regression times.
+    """
+    failures = []
+    for archive, results in current["archives"].items():
+        if archive not in previous["archives"]:
+            continue
+        print(f"\n{archive} shows, current / previous")
+        print(f"{'entry point':<40}{'p50':>8}{'p90':>8}{'peak':>8}{'queries':>9}")
+        previous_results = previous["archives"][archive]["entry_points"]
+        for name, result in results["entry_points"].items():
+            if name not in previous_results:
+                continue
+            before = previous_results[name]
+            ratios = {
+                metric: result[metric] / before[metric] if before[metric] else None
+                for metric in ["p50_ms", "p90_ms", "peak_kib", "queries"]
+            }
+            print(
+                f"{name:<40}"
+                + "".join(
+                    f"{'-' if ratio is None else f'{ratio:.2f}':>{width}}"
+                    for ratio, width in zip(ratios.values(), [8, 8, 8, 9])
+                )
+            )
+            for metric in ["p50_ms", "peak_kib", "queries"]:
+                if ratios[metric] is not None and ratios[metric] > max_regression:
+                    failures.append(
+                        f"{archive} shows {name}: {metric} {before[metric]} -> {result[metric]}"
+                    )
+    return failures
+
+
+def check_thresholds(current, thresholds):
+    """
+    Inputs: Results of a run and a dictionary mapping entry points (or "*" for all of them) to limits on their
+    metrics, e.g. {"Champions.get_champions": {"p90_ms": 500, "queries": 2}, "*": {"peak_kib": 100000}}
+
+    Output: List describing every limit a result exceeds
+    """
+    failures = []
+    for archive, results in current["archives"].items():
+        for name, result in results["entry_points"].items():
+            limits = {**thresholds.get("*", {}), **thresholds.get(name, {})}
+            for metric, limit in limits.items():
+                if result.get(metric) is not None and result[metric] > limit:
+                    failures.append(
+                        f"{archive} shows {name}: {metric} {result[metric]} > {limit}"
+                    )
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time the JeopardyFunctions entry points and page callbacks."
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="*",
+        type=int,
+        default=[],
+        help="load a synthetic archive of each size in turn and benchmark it, instead of the current database",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--memory-samples", type=int, default=3)
+    parser.add_argument(
+        "--entry-points", nargs="*", help="entry points to run, all of them by default"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=1.5,
+        help="fail when a p50, peak or query count grows this many times over --compare",
+    )
+    parser.add_argument(
+        "--thresholds",
+        help="JSON file of limits per entry point (see check_thresholds)",
+    )
+    parser.add_argument(
+        "--pgdata", help="use a local Postgres server in this directory"
+    )
+    parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="allow --sizes to replace an existing games_view table",
+    )
+    args = parser.parse_args()
+
+    if args.pgdata:
+        start_local_database(args.pgdata)
+    names = args.entry_points or list(entry_points())
+    if (
+        args.sizes
+        and not args.replace
+        and read_value("SELECT to_regclass('games_view')::text")
+    ):
+        parser.error("the database already has a games_view table, pass --replace")
+
+    current = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip(),
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "samples": args.samples,
+        "archives": {},
+    }
+    for size in args.sizes or [None]:
+        if size is not None:
+            print(f"loading {size} shows")
+            load_archive(size, args.seed)
+        print_header(f"{size or 'current'} shows")
+        results = run(names, args.seed, args.samples, args.memory_samples)
+        current["archives"][str(results["shows"])] = results
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(current, file, indent=1)
+
+    failures = []
+    if args.compare:
+        with open(args.compare) as file:
+            failures += compare(json.load(file), current, args.max_regression)
+    if args.thresholds:
+        with open(args.thresholds) as file:
+            failures += check_thresholds(current, json.load(file))
+    if failures:
+        print("\nexceeded:\n" + "\n".join(failures))
+        sys.exit(1)
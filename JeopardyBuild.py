@@ -0,0 +1,201 @@
+import argparse
+import time
+
+from JeopardyDatabase import connection
+
+# clue_search is a copy of the searchable clues_view columns, stored newest first, with trigram indexes so that
+# the ILIKE searches of the Clue Search and Category Exploration pages use an index instead of scanning clues_view.
+search_index_statements = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """CREATE MATERIALIZED VIEW IF NOT EXISTS clue_search AS
+        SELECT show_number, air_date, round_id, clue_value, category, clue, n_correct, correct_response
+        FROM clues_view
+        ORDER BY air_date desc
+        WITH NO DATA""",
+    "CREATE INDEX IF NOT EXISTS clue_search_clue_trgm ON clue_search USING gin (clue gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS clue_search_category_trgm ON clue_search USING gin (category gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS clue_search_correct_response_trgm ON clue_search USING gin (correct_response gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS clue_search_air_date ON clue_search (air_date desc)",
+    "REFRESH MATERIALIZED VIEW clue_search",
+    "ANALYZE clue_search",
+]
+
+# board_cube holds, for every air date and board cell, the partial sums behind the Visualizations heatmaps, and
+# fj_cube the Final Jeopardy results of every air date, so any date range is answered by differencing prefix sums.
+board_cube_statements = [
+    "DROP TABLE IF EXISTS board_cube",
+    """CREATE TABLE board_cube AS
+        SELECT air_date::date air_date, round_id, row_id, category_column,
+            COUNT(n_correct) n_clues,
+            COALESCE(SUM(n_correct), 0) n_correct,
+            SUM(CASE WHEN LEFT(value,2) = 'DD' then 1 else 0 end) n_dd,
+            COALESCE(SUM(CASE WHEN is_dd = false then (n_correct * clue_value::float - n_incorrect * clue_value::float) end), 0) ev_sum,
+            COUNT(CASE WHEN is_dd = false then (n_correct * clue_value::float - n_incorrect * clue_value::float) end) ev_count
+        FROM clues_view
+        WHERE round_id in ('J', 'DJ')
+        GROUP BY air_date::date, round_id, row_id, category_column""",
+    "DROP TABLE IF EXISTS fj_cube",
+    """CREATE TABLE fj_cube AS
+        WITH shows as (
+            SELECT c.air_date::date air_date, COUNT(DISTINCT c.show_number) n_shows
+            FROM games_view g
+            INNER JOIN clues_view c on c.show_number = g.show_number
+            WHERE regular_season = True
+            GROUP BY c.air_date::date
+        ), fj as (
+            SELECT c.air_date::date air_date, n_correct, COUNT(n_correct) n_clues
+            FROM clues_view c
+            INNER JOIN games_view g on g.show_number = c.show_number
+            WHERE round_id = 'FJ' and regular_season = True and n_correct is not null
+            GROUP BY c.air_date::date, n_correct
+        )
+        SELECT air_date, n_shows, n_correct, COALESCE(n_clues, 0) n_clues
+        FROM shows
+        LEFT JOIN fj using(air_date)""",
+]
+
+# clue_outcomes encodes who responded to every clue as bitmasks over the seats of the game (1 for contestant_1, 2 for
+# contestant_2 and 4 for the returning_champion of games_view), matching whole nicknames in the comma separated
+# correct_contestants and incorrect_contestants lists, so scoring never has to search the nickname text. The table is
+# refilled in place so that clues_typed, which reads it, survives a rebuild.
+clue_outcomes_statements = [
+    """CREATE TABLE IF NOT EXISTS clue_outcomes (
+        show_number int, round_id text, order_number text, correct_mask smallint, incorrect_mask smallint
+    )""",
+    "TRUNCATE clue_outcomes",
+    r"""INSERT INTO clue_outcomes
+        WITH responders as (
+            SELECT c.show_number, c.round_id, c.order_number,
+                regexp_split_to_array(trim(c.correct_contestants), '\s*,\s*') correct,
+                regexp_split_to_array(trim(c.incorrect_contestants), '\s*,\s*') incorrect,
+                g.contestant_1_nickname, g.contestant_2_nickname, g.returning_champion_nickname
+            FROM clues_view c
+            INNER JOIN games_view g on g.show_number = c.show_number
+        )
+        SELECT show_number, round_id, order_number,
+            (CASE WHEN contestant_1_nickname = ANY(correct) THEN 1 ELSE 0 END
+                | CASE WHEN contestant_2_nickname = ANY(correct) THEN 2 ELSE 0 END
+                | CASE WHEN returning_champion_nickname = ANY(correct) THEN 4 ELSE 0 END)::smallint correct_mask,
+            (CASE WHEN contestant_1_nickname = ANY(incorrect) THEN 1 ELSE 0 END
+                | CASE WHEN contestant_2_nickname = ANY(incorrect) THEN 2 ELSE 0 END
+                | CASE WHEN returning_champion_nickname = ANY(incorrect) THEN 4 ELSE 0 END)::smallint incorrect_mask
+        FROM responders""",
+    "CREATE INDEX IF NOT EXISTS clue_outcomes_clue ON clue_outcomes (show_number, round_id, order_number)",
+    "ANALYZE clue_outcomes",
+]
+
+# clues_typed is clues_view with the columns the per-show pages compute with stored as proper types: an enum round,
+# integer order numbers (61 for Final Jeopardy and 62 for the tiebreaker), integer clue values (0 outside the
+# Jeopardy and Double Jeopardy rounds), the integer amount won or lost on each clue parsed from value, a boolean
+# is_dd and the clue_outcomes masks. It is built after clue-outcomes.
+clues_typed_statements = [
+    """DO $$ BEGIN
+        CREATE TYPE clue_round AS ENUM ('J', 'DJ', 'FJ', 'TB');
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$""",
+    "DROP MATERIALIZED VIEW IF EXISTS clues_typed",
+    r"""CREATE MATERIALIZED VIEW clues_typed AS
+        SELECT c.show_number, c.air_date, c.round_id::clue_round round_id,
+            CASE c.order_number WHEN 'FJ' THEN 61 WHEN 'TB' THEN 62 ELSE c.order_number::int END::smallint order_number,
+            COALESCE(c.category_column, 0)::smallint category_column, COALESCE(c.row_id, 0)::smallint row_id,
+            c.category, c.clue, c.correct_response,
+            CASE WHEN c.round_id in ('J', 'DJ') THEN c.clue_value::int ELSE 0 END clue_value,
+            COALESCE(replace(substring(c.value from '\$([0-9,]+)'), ',', '')::int, 0) wager_value,
+            c.value,
+            COALESCE(c.is_dd, LEFT(c.value, 2) = 'DD', false) is_dd,
+            c.n_correct, c.n_incorrect, c.correct_contestants, c.incorrect_contestants,
+            COALESCE(o.correct_mask, 0) correct_mask, COALESCE(o.incorrect_mask, 0) incorrect_mask
+        FROM clues_view c
+        LEFT JOIN clue_outcomes o on o.show_number = c.show_number and o.round_id = c.round_id and o.order_number = c.order_number""",
+    "CREATE INDEX clues_typed_show_number ON clues_typed (show_number)",
+    "ANALYZE clues_typed",
+]
+
+# champion_stats holds the Champions page leaderboard and, for every champion, how often they answered the clues of
+# their regular season games correctly (read from clue_outcomes, so it is built after it), so selecting a champion
+# does not aggregate their games again.
+champion_stats_statements = [
+    "DROP TABLE IF EXISTS champion_stats",
+    """CREATE TABLE champion_stats AS
+        WITH champions as (
+            SELECT contestant, max(returning_champion_streak::float) streak, max(returning_champion_winnings) winnings,
+                max(returning_champion_winnings::float)/max(returning_champion_streak::float) average_winnings
+            FROM contestants c
+            INNER JOIN games_view g on c.contestant = g.returning_champion
+            WHERE regular_season = True AND returning_champion_winnings is not null
+            GROUP BY contestant
+        ), responses as (
+            SELECT c.contestant,
+                COUNT(*) FILTER (WHERE cl.round_id <> 'FJ') n_clues,
+                COUNT(*) FILTER (WHERE cl.round_id <> 'FJ' and o.correct_mask & c.seat > 0) n_correct,
+                COUNT(*) FILTER (WHERE cl.round_id <> 'FJ' and o.incorrect_mask & c.seat > 0) n_incorrect,
+                COUNT(*) FILTER (WHERE cl.round_id = 'FJ') n_fj,
+                COUNT(*) FILTER (WHERE cl.round_id = 'FJ' and o.correct_mask & c.seat > 0) n_fj_correct
+            FROM (
+                SELECT DISTINCT c.contestant, c.show_number,
+                    CASE c.contestant WHEN g.contestant_1 THEN 1 WHEN g.contestant_2 THEN 2 WHEN g.returning_champion THEN 4 ELSE 0 END seat
+                FROM contestants c
+                INNER JOIN games_view g on g.show_number = c.show_number
+                WHERE regular_season = True and c.contestant in (SELECT contestant FROM champions)
+            ) c
+            INNER JOIN clues_view cl on cl.show_number = c.show_number
+            LEFT JOIN clue_outcomes o on o.show_number = cl.show_number and o.round_id = cl.round_id and o.order_number = cl.order_number
+            GROUP BY c.contestant
+        )
+        SELECT contestant, streak, winnings, average_winnings,
+            100 * n_correct::float / NULLIF(n_clues, 0) percent_correct,
+            100 * n_correct::float / NULLIF(n_correct + n_incorrect, 0) response_accuracy,
+            100 * n_fj_correct::float / NULLIF(n_fj, 0) fj_accuracy
+        FROM champions
+        LEFT JOIN responses using(contestant)
+        ORDER BY winnings desc""",
+]
+
+# data_version is a single row counter the dashboards poll to know when their cached layout data is stale. Every
+# build ends by bumping it, and so should anything else that loads new games (python JeopardyBuild.py data-version).
+data_version_statements = [
+    "CREATE TABLE IF NOT EXISTS data_version (version bigint NOT NULL, updated_at timestamptz NOT NULL DEFAULT now())",
+    "INSERT INTO data_version (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM data_version)",
+    "UPDATE data_version SET version = version + 1, updated_at = now()",
+]
+
+build_steps = {
+    "search-index": search_index_statements,
+    "board-cube": board_cube_statements,
+    "clue-outcomes": clue_outcomes_statements,
+    "clues-typed": clues_typed_statements,
+    "champion-stats": champion_stats_statements,
+    "data-version": data_version_statements,
+}
+
+
+def run_statements(statements):
+    with connection() as conn:
+        cur = conn.cursor()
+        for statement in statements:
+            cur.execute(statement)
+        conn.commit()
+        cur.close()
+
+
+def build(steps):
+    if "data-version" not in steps:
+        steps = [*steps, "data-version"]
+    for step in steps:
+        start = time.perf_counter()
+        run_statements(build_steps[step])
+        print(f"{step}: built in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the derived tables and indexes the dashboards read from."
+    )
+    parser.add_argument(
+        "steps",
+        nargs="*",
+        choices=list(build_steps),
+        default=list(build_steps),
+        help="steps to run, all of them by default",
+    )
+    build(parser.parse_args().steps)
@@ -0,0 +1,190 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import plotly.io
+
+from JeopardyDatabase import read_value
+
+# Seconds between checks of the data_version marker. Within this window cached values are served without
+# touching the database; after it, one cheap query decides whether they are still current.
+cache_ttl = float(os.getenv("jeopardy_cache_ttl", 60))
+# Serialized figures kept in memory per worker, least recently used evicted first
+figure_cache_bytes = int(os.getenv("jeopardy_figure_cache_bytes", 64 * 2**20))
+# Optional directory where workers share serialized figures with each other
+figure_cache_dir = os.getenv("jeopardy_figure_cache_dir")
+
+_lock = threading.Lock()
+_values = {}
+_version = None
+_checked_at = None
+
+_figures = OrderedDict()
+_figure_stats = {"bytes": 0, "hits": 0, "disk_hits": 0, "misses": 0}
+# Functions dropping caches kept outside this module, such as the per-show game cache
+_clear_hooks = []
+
+
+def data_version():
+    """
+    Output: The version in the data_version table, re-read at most once every cache_ttl seconds. When it has changed
+    since the last check, every value cached with @cached or @cached_figures is dropped and the on_version_change
+    hooks are called.
+    """
+    global _version, _checked_at
+    now = time.monotonic()
+    if _checked_at is None or now - _checked_at >= cache_ttl:
+        version = read_value("SELECT max(version) FROM data_version")
+        with _lock:
+            changed = version != _version
+            if changed:
+                _values.clear()
+                _figures.clear()
+                _figure_stats["bytes"] = 0
+                _version = version
+            _checked_at = now
+        if changed:
+            _run_clear_hooks()
+            _prune_figure_dir(version)
+    return _version
+
+
+def on_version_change(hook):
+    """
+    Registers a function that drops a cache of its own, called whenever the data version changes or clear_cache runs.
+    """
+    _clear_hooks.append(hook)
+    return hook
+
+
+def _run_clear_hooks():
+    for hook in _clear_hooks:
+        hook()
+
+
+def cached(function):
+    """
+    Caches the results of function per argument tuple until the data version changes. The cached objects are shared
+    between requests, so callers must not modify them.
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args):
+        data_version()
+        key = (function, args)
+        try:
+            return _values[key]
+        except KeyError:
+            pass
+        value = function(*args)
+        with _lock:
+            _values[key] = value
+        return value
+
+    return wrapper
+
+
+def cached_figures(function):
+    """
+    Caches the figures (or tuple of figures) a callback returns as Plotly JSON, keyed by the callback, its inputs and
+    the data version. Repeat requests are answered from memory, or from figure_cache_dir when another worker built
+    the figures, without running the callback.
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args):
+        version = data_version()
+        key = hashlib.sha256(
+            repr((function.__module__, function.__qualname__, args)).encode()
+        ).hexdigest()
+        key = f"{version}-{key}"
+
+        payload = _get_figure(key)
+        if payload is None:
+            payload = plotly.io.json.to_json_plotly(function(*args))
+            _put_figure(key, payload)
+        return json.loads(payload)
+
+    return wrapper
+
+
+def _get_figure(key):
+    with _lock:
+        payload = _figures.get(key)
+        if payload is not None:
+            _figures.move_to_end(key)
+            _figure_stats["hits"] += 1
+            return payload
+
+    if figure_cache_dir:
+        try:
+            with open(os.path.join(figure_cache_dir, f"{key}.json")) as file:
+                payload = file.read()
+        except OSError:
+            payload = None
+        if payload is not None:
+            _put_figure(key, payload, write=False)
+            with _lock:
+                _figure_stats["disk_hits"] += 1
+            return payload
+
+    with _lock:
+        _figure_stats["misses"] += 1
+    return None
+
+
+def _put_figure(key, payload, write=True):
+    with _lock:
+        if key not in _figures:
+            _figure_stats["bytes"] += len(payload)
+        _figures[key] = payload
+        _figures.move_to_end(key)
+        while _figure_stats["bytes"] > figure_cache_bytes and len(_figures) > 1:
+            _, evicted = _figures.popitem(last=False)
+            _figure_stats["bytes"] -= len(evicted)
+
+    if figure_cache_dir and write:
+        # Written under a temporary name and renamed so other workers never read a partial file
+        path = os.path.join(figure_cache_dir, f"{key}.json")
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        try:
+            os.makedirs(figure_cache_dir, exist_ok=True)
+            with open(temporary, "w") as file:
+                file.write(payload)
+            os.replace(temporary, path)
+        except OSError:
+            pass
+
+
+def _prune_figure_dir(version):
+    # Figures of older data versions can never be requested again
+    if not figure_cache_dir or not os.path.isdir(figure_cache_dir):
+        return
+    for name in os.listdir(figure_cache_dir):
+        if not name.startswith(f"{version}-"):
+            try:
+                os.remove(os.path.join(figure_cache_dir, name))
+            except OSError:
+                pass
+
+
+def figure_cache_status():
+    """
+    Output: dictionary with the number and total size of the figures cached in this worker and its hit counts.
+    """
+    with _lock:
+        return {"entries": len(_figures), **_figure_stats}
+
+
+def clear_cache():
+    global _checked_at
+    with _lock:
+        _values.clear()
+        _figures.clear()
+        _figure_stats["bytes"] = 0
+        _checked_at = None
+    _run_clear_hooks()
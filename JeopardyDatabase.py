@@ -0,0 +1,354 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import pandas as pd
+from sqlalchemy import create_engine, event
+
+from JeopardyMetrics import observe
+
+database_url = os.getenv("database_url_jeopardy")
+
+# Each gunicorn worker holds at most pool_size + max_overflow connections, so the
+# worker count times that sum has to stay below the database's connection limit.
+pool_size = int(os.getenv("jeopardy_pool_size", 5))
+max_overflow = int(os.getenv("jeopardy_pool_max_overflow", 5))
+pool_timeout = float(os.getenv("jeopardy_pool_timeout", 30))
+pool_recycle = int(os.getenv("jeopardy_pool_recycle", 1800))
+# Threads used to run independent queries of one request side by side, each on its own pooled connection
+query_threads = int(os.getenv("jeopardy_query_threads", 4))
+# Query profiler: statements slower than this many milliseconds are recorded with their parameters, and the slowest
+# run of each is explained with EXPLAIN (ANALYZE, BUFFERS) on a background thread. Off when 0. Explaining runs the
+# statement again, so this is meant for diagnosing, not for every deployment.
+slow_query_ms = float(os.getenv("jeopardy_slow_query_ms", 0))
+# Number of distinct slow statements kept, slowest first
+slow_query_top = int(os.getenv("jeopardy_slow_query_top", 20))
+
+logger = logging.getLogger(__name__)
+
+_engine = None
+_engine_lock = threading.Lock()
+_executor = None
+_explain_executor = None
+
+_slow_queries_lock = threading.Lock()
+_slow_queries = {}
+# PREPARE statements by name, run on each pooled connection the first time it executes the statement
+_prepared = {}
+
+_stats_lock = threading.Lock()
+_stats = {
+    "connects": 0,
+    "checkouts": 0,
+    "invalidations": 0,
+    "queries": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(
+                    database_url,
+                    pool_size=pool_size,
+                    max_overflow=max_overflow,
+                    pool_timeout=pool_timeout,
+                    pool_recycle=pool_recycle,
+                    pool_pre_ping=True,
+                )
+                event.listen(engine, "connect", _on_connect)
+                event.listen(engine, "checkout", _on_checkout)
+                event.listen(engine, "invalidate", _on_invalidate)
+                _engine = engine
+    return _engine
+
+
+def _increment(stat, amount=1):
+    with _stats_lock:
+        _stats[stat] += amount
+
+
+def _on_connect(dbapi_connection, connection_record):
+    _increment("connects")
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _increment("checkouts")
+
+
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    _increment("invalidations")
+
+
+def _dispose_after_fork():
+    # Connections inherited from a parent process must not be shared with it, so
+    # every forked worker starts with an empty pool of its own. Threads do not
+    # survive a fork either, so the query executors are recreated on first use.
+    global _executor, _explain_executor
+    if _engine is not None:
+        _engine.dispose(close=False)
+    _executor = None
+    _explain_executor = None
+
+
+os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
+@contextmanager
+def connection():
+    """
+    Checks a DBAPI (psycopg2) connection out of the process-wide pool and returns it to the pool on exit.
+    """
+    start = time.perf_counter()
+    conn = get_engine().raw_connection()
+    waited = time.perf_counter() - start
+    with _stats_lock:
+        _stats["wait_seconds_total"] += waited
+        _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], waited)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _caller():
+    # The first function outside this module, e.g. "JeopardyFunctions.load_game"
+    frame = sys._getframe(2)
+    while frame.f_globals.get("__name__") == __name__:
+        frame = frame.f_back
+    module = frame.f_globals.get("__name__", "").removeprefix("pages.")
+    return f"{module}.{frame.f_code.co_qualname}"
+
+
+@contextmanager
+def _profiled(cur, query, params, caller):
+    # Times executing and fetching a statement, and records it when the query profiler is on and it was slow
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    observe("query", caller, seconds)
+    if slow_query_ms and 1000 * seconds >= slow_query_ms:
+        _record_slow_query(caller, query, params, cur.query.decode(), seconds)
+
+
+def prepare(name, parameter_types, query):
+    """
+    Inputs: Statement name, list of the Postgres types of its parameters and the query, with the parameters written
+    as $1, $2, ...
+
+    Output: The name, to pass to read_prepared. The statement is prepared on each pooled connection the first time
+    it runs there, so the server parses it once per connection and can reuse its plan.
+    """
+    _prepared[name] = f"PREPARE {name} ({', '.join(parameter_types)}) AS {query}"
+    return name
+
+
+def _ensure_prepared(conn, cur, name):
+    # conn.info lives as long as the DBAPI connection, so a replaced connection prepares its statements again
+    prepared = conn.info.setdefault("jeopardy_prepared", set())
+    if name not in prepared:
+        cur.execute(_prepared[name])
+        prepared.add(name)
+
+
+def read_prepared(name, params):
+    """
+    Inputs: Name returned by prepare and the values of its parameters
+
+    Output: DataFrame of the rows the prepared statement returns
+    """
+    query = f"EXECUTE {name} ({', '.join(['%s'] * len(params))})"
+    return _read_sql(query, params, _caller(), prepared=name)
+
+
+def _read_sql(query, params, caller, prepared=None):
+    _increment("queries")
+    with connection() as conn:
+        cur = conn.cursor()
+        if prepared is not None:
+            _ensure_prepared(conn, cur, prepared)
+        with _profiled(cur, query, params, caller):
+            cur.execute(query, params)
+            columns = [column[0] for column in cur.description]
+            results = cur.fetchall()
+        cur.close()
+    return pd.DataFrame.from_records(results, columns=columns, coerce_float=True)
+
+
+def read_sql(query, params=None):
+    return _read_sql(query, params, _caller())
+
+
+def read_value(query, params=None):
+    _increment("queries")
+    caller = _caller()
+    with connection() as conn:
+        cur = conn.cursor()
+        with _profiled(cur, query, params, caller):
+            cur.execute(query, params)
+            result = cur.fetchone()
+        cur.close()
+    return None if result is None else result[0]
+
+
+def _record_slow_query(caller, query, params, statement, seconds):
+    key = (caller, " ".join(query.split()))
+    milliseconds = round(1000 * seconds, 1)
+    with _slow_queries_lock:
+        entry = _slow_queries.get(key)
+        if entry is None:
+            if len(_slow_queries) >= slow_query_top:
+                # Keeps the slowest statements: a new one replaces the fastest kept, if it is slower
+                fastest = min(_slow_queries, key=lambda k: _slow_queries[k]["max_ms"])
+                if _slow_queries[fastest]["max_ms"] >= milliseconds:
+                    return
+                del _slow_queries[fastest]
+            entry = _slow_queries[key] = {
+                "caller": caller,
+                "query": key[1],
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "explaining": False,
+                "plan": None,
+            }
+        entry["count"] += 1
+        entry["total_ms"] += milliseconds
+        explain = milliseconds > entry["max_ms"] and not entry["explaining"]
+        if milliseconds > entry["max_ms"]:
+            entry["max_ms"] = milliseconds
+            entry["params"] = json.loads(json.dumps(params, default=str))
+            entry["statement"] = statement
+        entry["explaining"] = entry["explaining"] or explain
+    logger.warning("slow query from %s took %.1f ms", caller, milliseconds)
+    if explain:
+        _get_explain_executor().submit(_explain, entry, statement)
+
+
+def _get_explain_executor():
+    global _explain_executor
+    if _explain_executor is None:
+        with _engine_lock:
+            if _explain_executor is None:
+                _explain_executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="jeopardy-explain"
+                )
+    return _explain_executor
+
+
+def _explain(entry, statement):
+    # Runs on the explain thread. Only reads and the (read only) prepared statements are explained, and the
+    # transaction is rolled back either way.
+    try:
+        words = statement.split(None, 2)
+        if words[0].upper() not in ("SELECT", "WITH", "EXECUTE"):
+            plan = None
+        else:
+            with connection() as conn:
+                cur = conn.cursor()
+                try:
+                    if words[0].upper() == "EXECUTE":
+                        _ensure_prepared(conn, cur, words[1])
+                    cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement)
+                    plan = "\n".join(row[0] for row in cur.fetchall())
+                finally:
+                    cur.close()
+                    conn.rollback()
+    except Exception as error:
+        plan = f"EXPLAIN failed: {error}"
+    with _slow_queries_lock:
+        entry["plan"] = plan
+        entry["plan_statement"] = statement
+        entry["explaining"] = False
+
+
+def slow_query_report():
+    """
+    Output: List with one dictionary per slow statement kept by the query profiler, slowest first: the calling
+    function, the statement as written, how often it was slow, its total and largest time, the parameters and bound
+    statement of its slowest run, and the EXPLAIN (ANALYZE, BUFFERS) plan of the slowest run explained so far.
+    """
+    with _slow_queries_lock:
+        report = [
+            {name: value for name, value in entry.items() if name != "explaining"}
+            for entry in _slow_queries.values()
+        ]
+    for entry in report:
+        entry["total_ms"] = round(entry["total_ms"], 1)
+    return sorted(report, key=lambda entry: entry["max_ms"], reverse=True)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _engine_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=query_threads, thread_name_prefix="jeopardy-query"
+                )
+    return _executor
+
+
+def _timed_read_sql(query, params, caller):
+    start = time.perf_counter()
+    result = _read_sql(query, params, caller)
+    return result, time.perf_counter() - start
+
+
+def read_sql_parallel(queries):
+    """
+    Inputs: Dictionary mapping a name to a query, or to a (query, params) tuple
+
+    Output: Generator of (name, DataFrame, seconds) tuples in the order the queries finish. The queries run at the
+    same time on the shared query threads, so callers can work on early results while the rest are still running.
+    """
+    executor = _get_executor()
+    caller = _caller()
+    futures = {}
+    for name, query in queries.items():
+        query, params = query if isinstance(query, tuple) else (query, None)
+        # Each query runs in a copy of this context so its timing counts towards the current request, and is recorded
+        # in the query histogram under its own name
+        future = executor.submit(
+            contextvars.copy_context().run,
+            _timed_read_sql,
+            query,
+            params,
+            f"{caller}:{name}",
+        )
+        futures[future] = name
+
+    for future in as_completed(futures):
+        result, seconds = future.result()
+        yield futures[future], result, seconds
+
+
+def pool_status():
+    """
+    Output: dictionary describing this worker's pool, its current usage, and the number of checkouts, queries and the
+    time spent waiting for a connection since the process started.
+    """
+    pool = get_engine().pool
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["wait_seconds_avg"] = (
+        stats["wait_seconds_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+    )
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        **stats,
+    }
@@ -1,19 +1,211 @@
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine
 import os
+import re
+from collections import namedtuple
+from functools import lru_cache
 from joblib import load
-import psycopg2
+from JeopardyCache import cached, data_version, on_version_change
+from JeopardyDatabase import prepare, read_prepared, read_sql, read_value
+
+model_path = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "logistic_regression.joblib"
+)
+game_cache_size = int(os.getenv("jeopardy_game_cache_size", 128))
+
+game_columns = [
+    "contestant_1_nickname",
+    "contestant_2_nickname",
+    "returning_champion_nickname",
+    "contestant_1_score",
+    "contestant_2_score",
+    "returning_champion_score",
+    "winning_contestant",
+    "regular_season",
+]
+
+GameBundle = namedtuple("GameBundle", ["show_number", "clues", "game"])
+
+# Every clue of a show with its game details, the lookup behind the Game Summary and Win Probability pages
+game_statement = prepare(
+    "jeopardy_game",
+    ["integer"],
+    f"""SELECT c.*, {", ".join(f"g.{column} game_{column}" for column in game_columns)}
+        FROM games_view g
+        LEFT JOIN clues_typed c on c.show_number = g.show_number
+        where g.show_number = $1""",
+)
+# The Jeopardy and Double Jeopardy clues of several shows with their contestants and final scores
+games_clues_statement = prepare(
+    "jeopardy_games_clues",
+    ["integer[]"],
+    """SELECT c.show_number, c.round_id, c.order_number, c.is_dd, c.clue_value, c.correct_mask, c.incorrect_mask,
+            g.contestant_1, g.contestant_2, g.returning_champion,
+            g.contestant_1_score, g.contestant_2_score, g.returning_champion_score
+        FROM games_view g
+        INNER JOIN clues_typed c on c.show_number = g.show_number
+        WHERE g.show_number = ANY($1) and c.round_id in ('J', 'DJ')""",
+)
+
+round_dtype = pd.CategoricalDtype(["J", "DJ", "FJ", "TB"], ordered=True)
+# Column types of clues_typed once read into pandas
+clue_dtypes = {
+    "show_number": np.int64,
+    "round_id": round_dtype,
+    "order_number": np.int16,
+    "category_column": np.int8,
+    "row_id": np.int8,
+    "clue_value": np.int64,
+    "wager_value": np.int64,
+    "is_dd": bool,
+    "correct_mask": np.int8,
+    "incorrect_mask": np.int8,
+}
+
+
+def as_clue_dtypes(clues):
+    """
+    Inputs: DataFrame of clues_typed rows
 
-database_url = os.getenv("database_url_jeopardy")
+    Output: The same rows with every clues_typed column it holds converted to its NumPy (or, for the round, ordered
+    categorical) type.
+    """
+    return clues.astype(
+        {column: dtype for column, dtype in clue_dtypes.items() if column in clues}
+    )
 
 
-def pivot_game(show_number):
-    engine = create_engine(database_url)
+def load_game(show_number):
+    """
+    Inputs: Show number
+
+    Output: GameBundle holding every clues_typed row of the show and its games_view details (nicknames, final scores,
+    winner and season type), fetched in a single query. Bundles are shared through an LRU cache, so callers must
+    copy the clues before modifying them.
+    """
+    # Checking the data version drops the cached bundles once the tables have been rebuilt
+    data_version()
+    return _load_game(int(show_number))
+
+
+@lru_cache(maxsize=game_cache_size)
+def _load_game(show_number):
+    rows = read_prepared(game_statement, [show_number])
+    game = rows[[f"game_{column}" for column in game_columns]]
+    game.columns = game_columns
+    clues = rows.drop(columns=game.columns.map("game_{}".format))
+    clues = as_clue_dtypes(clues[clues["show_number"].notna()].reset_index(drop=True))
+    game = game.iloc[0] if len(game) else pd.Series(index=game_columns, dtype=object)
+
+    return GameBundle(show_number, clues, game)
+
+
+@on_version_change
+def clear_game_cache():
+    _load_game.cache_clear()
+
+
+@cached
+def max_air_date():
+    return read_value("Select max(air_date) from games_view")
+
+
+# Shows offered by each show dropdown. The win probability model was trained on regular season games decided in Final
+# Jeopardy from show 3966 on
+show_index_conditions = {
+    "all": "true",
+    "win_probability": "regular_season = true and show_number >= 3966 and winning_contestant <> 'Tied'",
+}
+
+
+@cached
+def load_show_index(shows="all"):
+    """
+    Inputs: Name of the show_index_conditions entry selecting the shows to index
+
+    Output: Dictionary with the matching show numbers, their dropdown labels and search text, and a sorted array of
+    lower case search keys (show number, ISO air date, contestant names and each word of them) with the position of
+    the show every key belongs to.
+    """
+    query = f"""SELECT show_number, CONCAT('Show Number #', show_number, ' - ', to_char(air_date, 'Day,  Month DD, YYYY')) label,
+        to_char(air_date, 'YYYY-MM-DD') air_date, contestant_1, contestant_2, returning_champion
+        FROM games_view where {show_index_conditions[shows]} ORDER BY show_number"""
+    shows = read_sql(query)
+
+    keys, positions, search = [], [], []
+    for position, row in enumerate(shows.itertuples(index=False)):
+        show_keys = {str(row.show_number), str(row.air_date)}
+        for name in (row.contestant_1, row.contestant_2, row.returning_champion):
+            if isinstance(name, str):
+                show_keys.add(name.lower())
+                show_keys.update(name.lower().split())
+        keys.extend(show_keys)
+        positions.extend([position] * len(show_keys))
+        search.append(" ".join([row.label, *sorted(show_keys)]))
+
+    order = np.argsort(keys, kind="stable")
+    return {
+        "show_numbers": shows["show_number"].to_numpy(dtype=int),
+        "labels": shows["label"].to_list(),
+        "search": search,
+        "keys": np.array(keys, dtype=str)[order],
+        "positions": np.array(positions, dtype=int)[order],
+    }
+
+
+def show_option(index, position):
+    # The search text lets the dropdown's own filtering keep shows matched by date or contestant
+    return {
+        "label": index["labels"][position],
+        "value": int(index["show_numbers"][position]),
+        "search": index["search"][position],
+    }
+
+
+def search_shows(index, search_value, limit=20, selected=None):
+    """
+    Inputs: Show index from load_show_index, the text typed in a show dropdown, the maximum number of options, and the
+    show selected in the dropdown
+
+    Output: Dropdown options, most recent first, for the shows with a show number, air date or contestant name
+    starting with the typed text, followed by the selected show when it is not one of them.
+    """
+    prefix = search_value.strip().lower().lstrip("#").strip()
+    positions = []
+    if prefix:
+        start = np.searchsorted(index["keys"], prefix, side="left")
+        end = np.searchsorted(index["keys"], prefix + "\uffff", side="left")
+        positions = list(np.unique(index["positions"][start:end])[::-1][:limit])
+
+    # A Dropdown clears its value once the search text is emptied if the value is missing from the options
+    if selected is not None:
+        position = int(np.searchsorted(index["show_numbers"], int(selected)))
+        if (
+            position < len(index["show_numbers"])
+            and index["show_numbers"][position] == int(selected)
+            and position not in positions
+        ):
+            positions.append(position)
+    return [show_option(index, position) for position in positions]
+
+
+def _regular_clues(bundle, columns):
+    """
+    Output: The Jeopardy and Double Jeopardy clues of the bundle in the order they were picked, and the first names of
+    contestant_1, contestant_2 and returning_champion.
+    """
+    game = bundle.clues[bundle.clues["round_id"].isin(["J", "DJ"])][columns].copy()
+    game = game.sort_values(by=["round_id", "order_number"]).reset_index(drop=True)
+
+    first_names = [
+        str(bundle.game[f"{contestant}_nickname"]).split(" ")[0]
+        for contestant in contestant_columns
+    ]
+    return game, first_names
 
-    query = f"""SELECT * FROM clues_view where show_number = '{show_number}'"""
 
-    game = pd.read_sql(query, con=engine)
+def pivot_game(show_number):
+    game = load_game(show_number).clues.copy()
     game["category"] = game["category"].str.replace('"', "'")
     fj_correct_response = game[(game["round_id"] == "FJ")][
         ["category", "clue_value", "clue", "correct_response"]
@@ -21,16 +213,16 @@ def pivot_game(show_number):
     fj_clue = game[(game["round_id"] == "FJ")][
         ["category", "clue_value", "clue"]
     ].pivot(columns="category", index="clue_value", values="clue")
-    game = game[(game["clue_value"] != "FJ") & (game["clue_value"] != "TB")]
-    game["clue_value"] = game["clue_value"].astype(float)
 
     j_round_cat_order = (
         game[game["round_id"] == "J"][["category_column", "category"]]
+        .sort_values("category_column", kind="stable")
         .drop_duplicates()["category"]
         .to_list()
     )
     dj_round_cat_order = (
         game[game["round_id"] == "DJ"][["category_column", "category"]]
+        .sort_values("category_column", kind="stable")
         .drop_duplicates()["category"]
         .to_list()
     )
@@ -72,7 +264,6 @@ def pivot_game(show_number):
     )
     df_dj_correct_response = df_dj_correct_response[dj_round_cat_order]
 
-    engine.dispose()
     return (
         df_j_clues,
         df_j_correct_response,
@@ -83,152 +274,334 @@ def pivot_game(show_number):
     )
 
 
+contestant_columns = ["contestant_1", "contestant_2", "returning_champion"]
+# Bit of each of contestant_columns in the correct_mask and incorrect_mask columns of clue_outcomes
+contestant_masks = np.array([1, 2, 4])
+
+
+def _contestant_responses(game):
+    """
+    Inputs: Clues with the correct_mask and incorrect_mask columns of clue_outcomes
+
+    Output: Two boolean arrays of shape (clues, 3) flagging whether contestant_1, contestant_2 and returning_champion
+    responded correctly or incorrectly to each clue.
+    """
+    correct = game["correct_mask"].fillna(0).to_numpy(dtype=int).reshape(-1, 1)
+    incorrect = game["incorrect_mask"].fillna(0).to_numpy(dtype=int).reshape(-1, 1)
+    return (correct & contestant_masks) > 0, (incorrect & contestant_masks) > 0
+
+
+def _score_progression(correct, incorrect, values):
+    """
+    Output: Array of shape (clues + 1, 3) with every contestant's score before the first clue and after each clue,
+    where a correct response adds the clue's value and an incorrect response subtracts it.
+    """
+    deltas = (correct.astype(int) - incorrect.astype(int)) * values.reshape(-1, 1)
+    return np.vstack((np.zeros((1, 3), dtype=deltas.dtype), np.cumsum(deltas, axis=0)))
+
+
 def game_progression(show_number):
-    engine = create_engine(database_url)
-    query = f"""SELECT round_id, CAST(order_number as int), is_dd, clue_value,  correct_contestants, incorrect_contestants
-        FROM clues_view 
-        where show_number = '{show_number}' and round_id in ('J', 'DJ') ORDER BY round_id desc, order_number asc"""
-
-    game = pd.read_sql(query, con=engine)
-    query_nicks = f""" SELECT contestant_1_nickname, contestant_2_nickname, returning_champion_nickname from games_view where show_number = {show_number}"""
-    name_data = pd.read_sql(query_nicks, con=engine).melt()
-    name_data["variable"] = name_data["variable"].str.split("_n").str[0]
-    name_data["first_name"] = name_data["value"].str.split(" ").str[0]
-    rename_dict = dict(zip(name_data["first_name"], name_data["variable"]))
-
-    game.loc[:, "correct_contestants"] = (
-        game["correct_contestants"].replace(rename_dict, regex=True).replace(np.NaN, "")
-    )
-    game.loc[:, "incorrect_contestants"] = (
-        game["incorrect_contestants"]
-        .replace(rename_dict, regex=True)
-        .replace(np.NaN, "")
-    )
-
-    starting_state = np.array([0, 0, 0, 0])
-    contestant_1_score = 0
-    contestant_2_score = 0
-    returning_champion_score = 0
-
-    question_number = 0
-
-    contestant_1_correct = 0
-    contestant_2_correct = 0
-    returning_champion_correct = 0
-
-    contestant_1_incorrect = 0
-    contestant_2_incorrect = 0
-    returning_champion_incorrect = 0
-
-    for index, row in game.iterrows():
-        if "contestant_1" in row["correct_contestants"]:
-            contestant_1_score += row["clue_value"]
-            contestant_1_correct += 1
-        if "contestant_2" in row["correct_contestants"]:
-            contestant_2_score += row["clue_value"]
-            contestant_2_correct += 1
-        if "returning_champion" in row["correct_contestants"]:
-            returning_champion_score += row["clue_value"]
-            returning_champion_correct += 1
-
-        if "contestant_1" in row["incorrect_contestants"]:
-            contestant_1_score -= row["clue_value"]
-            contestant_1_incorrect += 1
-        if "contestant_2" in row["incorrect_contestants"]:
-            contestant_2_score -= row["clue_value"]
-            contestant_2_incorrect += 1
-        if "returning_champion" in row["incorrect_contestants"]:
-            returning_champion_score -= row["clue_value"]
-            returning_champion_incorrect += 1
-
-        question_number += 1
-
-        next_question = np.array(
-            [
-                question_number,
-                contestant_1_score,
-                contestant_2_score,
-                returning_champion_score,
-            ]
-        )
+    bundle = load_game(show_number)
+    game, players = _regular_clues(
+        bundle,
+        [
+            "round_id",
+            "order_number",
+            "is_dd",
+            "clue_value",
+            "correct_mask",
+            "incorrect_mask",
+        ],
+    )
 
-        starting_state = np.vstack((starting_state, next_question))
+    correct, incorrect = _contestant_responses(game)
+    scores = _score_progression(correct, incorrect, game["clue_value"].to_numpy())
+    starting_state = np.column_stack((np.arange(len(scores)), scores))
 
-    players = list(rename_dict.keys())
     df = pd.DataFrame(starting_state)
 
     daily_doubles = game["is_dd"].to_numpy()
-    daily_doubles = pd.Series(np.insert(daily_doubles, 0, False)).replace(
-        [True, False], [1, 0]
-    )
+    daily_doubles = pd.Series(np.insert(daily_doubles, 0, False)).astype(int)
 
     df = pd.concat([df, daily_doubles], axis=1)
     df.columns = ["Question Number", players[0], players[1], players[2], "Daily Double"]
 
-    query_final = f"""SELECT contestant_1_score, contestant_2_score, returning_champion_score from games_view where show_number = {show_number}"""
-    final_score = pd.read_sql(query_final, con=engine).to_numpy()
+    final_score = (
+        bundle.game[
+            ["contestant_1_score", "contestant_2_score", "returning_champion_score"]
+        ]
+        .infer_objects()
+        .to_numpy()
+    )
     final_score = np.insert(final_score, 0, df["Question Number"].max() + 1)
     final_score = pd.DataFrame(np.insert(final_score, 4, 0)).transpose()
     final_score.columns = df.columns
     df = pd.concat([df, final_score], axis=0).reset_index().drop(["index"], axis=1)
 
-    engine.dispose()
     return (
         df,
-        [contestant_1_correct, contestant_2_correct, returning_champion_correct],
-        [contestant_1_incorrect, contestant_2_incorrect, returning_champion_incorrect],
+        [int(n) for n in correct.sum(axis=0)],
+        [int(n) for n in incorrect.sum(axis=0)],
     )
 
 
-def find_data(search_destination, term, exact="Contains"):
-    conn = psycopg2.connect(database_url)
-    cur = conn.cursor()
-    search_destination_sql_dict = {
-        "Clue": "clue",
-        "Category": "category",
-        "Correct Response": "correct_response",
-    }
+def game_progression_many(show_numbers):
+    """
+    Inputs: Iterable of show numbers
 
-    clues_columns = [
-        "Air Date",
-        "Round",
-        "Clue Value",
-        "Category",
-        "Clue",
-        "Number Correct",
-        "Correct Response",
+    Output: Long-form DataFrame with one row per show, clue and contestant holding the show_number, the
+    question_number (0 before the first clue, then one per Jeopardy and Double Jeopardy clue and a last one holding
+    the final scores), the seat (contestant_1, contestant_2 or returning_champion), the contestant's name, their score
+    and whether the clue was a daily double. Every show is fetched in a single query.
+    """
+    clues = as_clue_dtypes(
+        read_prepared(games_clues_statement, [[int(s) for s in show_numbers]])
+    )
+    clues = clues.sort_values(by=["show_number", "round_id", "order_number"])
+    clues = clues.reset_index(drop=True)
+    games = clues.drop_duplicates("show_number")
+    shows = clues["show_number"].to_numpy()
+
+    correct, incorrect = _contestant_responses(clues)
+    deltas = (correct.astype(int) - incorrect.astype(int)) * clues[
+        "clue_value"
+    ].to_numpy().reshape(-1, 1)
+    scores = pd.DataFrame(deltas).groupby(shows).cumsum().to_numpy()
+    question_number = clues.groupby("show_number").cumcount().to_numpy() + 1
+
+    final_scores = games[
+        ["contestant_1_score", "contestant_2_score", "returning_champion_score"]
+    ].to_numpy(dtype=float)
+    last_question = clues.groupby("show_number").size().to_numpy() + 1
+    no_clue = np.zeros(len(games), dtype=int)
+
+    progression = pd.DataFrame(
+        {
+            "show_number": np.concatenate(
+                (games["show_number"], shows, games["show_number"])
+            ),
+            "question_number": np.concatenate(
+                (no_clue, question_number, last_question)
+            ),
+            "daily_double": np.concatenate(
+                (no_clue, clues["is_dd"].astype(int), no_clue)
+            ),
+        }
+    )
+    progression[contestant_columns] = np.vstack(
+        (np.zeros((len(games), 3)), scores, final_scores)
+    )
+
+    progression = progression.melt(
+        id_vars=["show_number", "question_number", "daily_double"],
+        value_vars=contestant_columns,
+        var_name="seat",
+        value_name="score",
+    )
+    names = games.melt(
+        id_vars="show_number",
+        value_vars=contestant_columns,
+        var_name="seat",
+        value_name="contestant",
+    )
+    progression = progression.merge(names, on=["show_number", "seat"], how="left")
+
+    return progression.sort_values(
+        by=["show_number", "question_number", "seat"]
+    ).reset_index(drop=True)[
+        [
+            "show_number",
+            "question_number",
+            "seat",
+            "contestant",
+            "score",
+            "daily_double",
+        ]
     ]
 
-    search_destination_sql = search_destination_sql_dict[search_destination]
-    if exact == "Contains":
-        query_clues = """
+
+def find_data(
+    search_destination, term, exact="Contains", sort_by=None, filter_query=""
+):
+    """
+    Inputs: Column to search, search term and search type, and optionally the sort_by and filter_query of the Clue
+    Search DataTable
+
+    Output: Every matching clue, newest first unless sort_by says otherwise.
+    """
+    conditions, params, order_by = _clue_search_query(
+        search_destination, term, exact, sort_by, filter_query
+    )
+    query_clues = f"""
         SELECT air_date, round_id round, clue_value, category, clue, n_correct, correct_response
-        FROM clues_view
-        WHERE {search_destination_sql} ILIKE '%{term}%'
-        ORDER BY air_date desc
-        """.format(
-            search_destination_sql=search_destination_sql, term=term
-        )
-        cur.execute(query_clues)
-        results = cur.fetchall()
-        clues = pd.DataFrame(results, columns=clues_columns)
-        return clues
+        FROM clue_search
+        WHERE {conditions}
+        ORDER BY {order_by}
+        """
+    clues = read_sql(query_clues, params)
+    clues.columns = list(clue_search_columns)
+    return clues
+
+
+clue_search_columns = {
+    "Air Date": "air_date",
+    "Round": "round_id",
+    "Clue Value": "clue_value",
+    "Category": "category",
+    "Clue": "clue",
+    "Number Correct": "n_correct",
+    "Correct Response": "correct_response",
+}
+
+filter_operators = {
+    "=": "=",
+    "eq": "=",
+    "!=": "<>",
+    "ne": "<>",
+    "<": "<",
+    "lt": "<",
+    "<=": "<=",
+    "le": "<=",
+    ">": ">",
+    "gt": ">",
+    ">=": ">=",
+    "ge": ">=",
+}
+
+filter_expression = re.compile(
+    r"\{(?P<column>[^}]+)\}\s+[si]?(?P<operator>>=|<=|!=|<|>|=|eq|ne|lt|le|gt|ge|contains|datestartswith)\s+(?P<value>.+)"
+)
+
+
+# Rows of each Clue Search summary table, the most frequent correct responses or categories; a common term matches
+# tens of thousands of them
+summary_rows = 100
+
+
+def _search_condition(search_destination, term, exact="Contains"):
+    search_destination_sql = clue_search_columns[search_destination]
+    if exact == "Contains":
+        return f"{search_destination_sql} ILIKE %s", [f"%{term}%"]
     else:
-        query_clues = """
+        return f"{search_destination_sql} ILIKE %s", [term]
+
+
+def parse_filter_query(filter_query):
+    """
+    Inputs: filter_query of a DataTable with filter_action="custom", e.g. '{Category} contains "art" && {Clue Value} > 400'
+
+    Output: SQL condition over clue_search (or None when nothing can be filtered on) and its parameters. Expressions on
+    unknown columns or with unsupported operators are ignored.
+    """
+    conditions = []
+    params = []
+    for part in (filter_query or "").split(" && "):
+        match = filter_expression.fullmatch(part.strip())
+        if match is None or match["column"] not in clue_search_columns:
+            continue
+        column = clue_search_columns[match["column"]]
+        value = match["value"].strip()
+        if value[:1] in ("'", '"', "`") and value[-1:] == value[:1]:
+            value = value[1:-1].replace("\\" + value[:1], value[:1])
+
+        if match["operator"] == "contains":
+            conditions.append(f"{column}::text ILIKE %s")
+            params.append(f"%{value}%")
+        elif match["operator"] == "datestartswith":
+            conditions.append(f"{column}::text LIKE %s")
+            params.append(f"{value}%")
+        else:
+            try:
+                if column in ("clue_value", "n_correct"):
+                    value = float(value)
+                elif column == "air_date":
+                    value = pd.Timestamp(value).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+            conditions.append(f"{column} {filter_operators[match['operator']]} %s")
+            params.append(value)
+
+    if not conditions:
+        return None, []
+    return " AND ".join(conditions), params
+
+
+def _clue_search_query(search_destination, term, exact, sort_by, filter_query):
+    """
+    Output: WHERE condition over clue_search and its parameters, and ORDER BY list, for a search refined by the
+    sort_by and filter_query of the Clue Search DataTable.
+    """
+    conditions, params = _search_condition(search_destination, term, exact)
+    filter_sql, filter_params = parse_filter_query(filter_query)
+    if filter_sql is not None:
+        conditions = f"{conditions} AND {filter_sql}"
+        params = params + filter_params
+
+    order_by = [
+        f"{clue_search_columns[sort['column_id']]} {'asc' if sort['direction'] == 'asc' else 'desc'}"
+        for sort in (sort_by or [])
+        if sort["column_id"] in clue_search_columns
+    ]
+    # air_date and clue break ties so rows keep their position from one page to the next
+    order_by += ["air_date desc", "clue"]
+    return conditions, params, ", ".join(order_by)
+
+
+def find_data_page(
+    search_destination,
+    term,
+    exact="Contains",
+    page_current=0,
+    page_size=12,
+    sort_by=None,
+    filter_query="",
+):
+    """
+    Inputs: The find_data search, the page of the results to return, and the sort_by and filter_query of a DataTable
+    using custom paging, sorting and filtering
+
+    Output: The requested page of matching clues with the same columns as find_data, and the total number of matches.
+    """
+    conditions, params, order_by = _clue_search_query(
+        search_destination, term, exact, sort_by, filter_query
+    )
+
+    query_count = f"SELECT COUNT(*) FROM clue_search WHERE {conditions}"
+    total = read_value(query_count, params)
+
+    query_clues = f"""
         SELECT air_date, round_id round, clue_value, category, clue, n_correct, correct_response
-        FROM clues_view
-        WHERE {search_destination_sql} ILIKE '{term}'
-        ORDER BY air_date desc
-        """.format(
-            search_destination_sql=search_destination_sql, term=term
-        )
-        cur.execute(query_clues)
-        results = cur.fetchall()
-        clues = pd.DataFrame(results, columns=clues_columns)
-        return clues
+        FROM clue_search
+        WHERE {conditions}
+        ORDER BY {order_by}
+        LIMIT %s OFFSET %s
+        """
+    clues = read_sql(query_clues, params + [page_size, page_current * page_size])
+    clues.columns = list(clue_search_columns)
+    return clues, total
 
-    cur.close()
-    conn.close()
+
+def find_data_summary(search_destination, term, exact="Contains"):
+    """
+    Output: Number of appearances and total number of correct responses of the summary_rows most frequent correct
+    responses (compared ignoring case, and returned in lower case) and categories among the non Final Jeopardy clues
+    matching the find_data search.
+    """
+    conditions, params = _search_condition(search_destination, term, exact)
+    summaries = []
+    for group_column in ["lower(correct_response)", "category"]:
+        query = f"""
+            SELECT {group_column}, COUNT(*), SUM(n_correct)
+            FROM clue_search
+            WHERE {conditions} and round_id <> 'FJ'
+            GROUP BY {group_column}
+            ORDER BY COUNT(*) desc, {group_column}
+            LIMIT %s
+            """
+        summary = read_sql(query, params + [summary_rows])
+        summary.columns = ["group", "Count", "Answered Correct"]
+        summaries.append(summary)
+    return summaries
 
 
 def game_progression_win_probability(show_number):
@@ -239,103 +612,55 @@ def game_progression_win_probability(show_number):
     the remaining value of clues on the board, and the remaining number of daily doubles.
     """
 
-    conn = psycopg2.connect(database_url)
-    cur_game = conn.cursor()
-    query = f"""SELECT round_id, CAST(order_number as int), is_dd, clue_value, value, correct_contestants, incorrect_contestants
-        FROM clues_view 
-        where show_number = '{show_number}' and round_id in ('J', 'DJ') ORDER BY round_id desc, order_number asc"""
-
-    cur_game.execute(query)
-    results = cur_game.fetchall()
-    game = pd.DataFrame(
-        results,
-        columns=[
+    game, players = _regular_clues(
+        load_game(show_number),
+        [
             "round_id",
             "order_number",
             "is_dd",
             "clue_value",
-            "value",
-            "correct_contestants",
-            "incorrect_contestants",
+            "wager_value",
+            "correct_mask",
+            "incorrect_mask",
         ],
     )
 
-    cur_nicknames = conn.cursor()
-    query_nicks = f""" SELECT contestant_1_nickname, contestant_2_nickname, returning_champion_nickname from games_view where show_number = {show_number}"""
-    cur_nicknames.execute(query_nicks)
-    nickname_results = cur_nicknames.fetchall()
-    name_data = pd.DataFrame(
-        nickname_results, columns=["contestant_1", "contestant_2", "returning_champion"]
-    ).melt()
-    cur_game.close()
-    cur_nicknames.close()
-    conn.close()
-    name_data["first_name"] = name_data["value"].str.split(" ").str[0]
-    rename_dict = dict(zip(name_data["first_name"], name_data["variable"]))
-
-    game.loc[:, "correct_contestants"] = (
-        game["correct_contestants"].replace(rename_dict, regex=True).replace(np.NaN, "")
-    )
-    game.loc[:, "incorrect_contestants"] = (
-        game["incorrect_contestants"]
-        .replace(rename_dict, regex=True)
-        .replace(np.NaN, "")
-    )
-
-    game["value"] = (
-        game["value"]
-        .str.split("$")
-        .str[1]
-        .replace("[\$,]", "", regex=True)
-        .astype(float)
-    )
-
-    starting_state = np.array([show_number, 0, 3, 54000, 0, 0, 0])  # , 0,0,0,0,0,0
-    contestant_1_score = 0
-    contestant_2_score = 0
-    returning_champion_score = 0
-
-    remaining_value = 54000
-    remaining_dds = 3
-    question_number = 0
-
-    for index, row in game.iterrows():
-        if "contestant_1" in row["correct_contestants"]:
-            contestant_1_score += row["value"]
-        if "contestant_2" in row["correct_contestants"]:
-            contestant_2_score += row["value"]
-        if "returning_champion" in row["correct_contestants"]:
-            returning_champion_score += row["value"]
-
-        if "contestant_1" in row["incorrect_contestants"]:
-            contestant_1_score -= row["value"]
-        if "contestant_2" in row["incorrect_contestants"]:
-            contestant_2_score -= row["value"]
-        if "returning_champion" in row["incorrect_contestants"]:
-            returning_champion_score -= row["value"]
-
-        remaining_value -= row["clue_value"]
-
-        if row["is_dd"] == True:
-            remaining_dds -= 1
-        question_number += 1
-
-        next_question = np.array(
-            [
-                show_number,
-                question_number,
-                remaining_dds,
-                remaining_value,
-                contestant_1_score,
-                contestant_2_score,
-                returning_champion_score,
-            ]
-        )
+    correct, incorrect = _contestant_responses(game)
+
+    return _win_probability_states(
+        show_number,
+        correct,
+        incorrect,
+        game["wager_value"].to_numpy(),
+        game["clue_value"].to_numpy(),
+        game["is_dd"].to_numpy(),
+    )
 
-        starting_state = np.vstack((starting_state, next_question))
+
+def _win_probability_states(
+    show_number, correct, incorrect, wagers, clue_values, is_dd
+):
+    """
+    Output: DataFrame with the state of the game before the first clue and after every clue, built with cumulative
+    sums over the signed wagers, the clue values taken off the board and the daily doubles found.
+    """
+    scores = _score_progression(correct, incorrect, wagers)
+    n_states = len(scores)
+    remaining_value = 54000 - np.concatenate(([0], np.cumsum(clue_values)))
+    remaining_dds = 3 - np.concatenate(([0], np.cumsum(is_dd)))
+
+    states = np.column_stack(
+        (
+            np.full(n_states, show_number),
+            np.arange(n_states),
+            remaining_dds,
+            remaining_value,
+            scores,
+        )
+    ).astype(float)
 
     return pd.DataFrame(
-        starting_state,
+        states,
         columns=[
             "show_number",
             "question_number",
@@ -348,84 +673,277 @@ def game_progression_win_probability(show_number):
     )
 
 
+@cached
+def load_win_probability_table():
+    """
+    Output: NumPy array of shape (7, 7, 3) indexed by the game_states codes of the first and second state, holding
+    the first, second and third place win probabilities from win_probability_table (NaN where the table has no row).
+    The table is read once per process and read again when the data version changes.
+    """
+    query = """SELECT first_state, second_state, "First Place" , "Second Place" , "Third Place" FROM  win_probability_table"""
+    table = read_sql(query)
+    lookup = np.full((len(game_states), len(game_states), 3), np.nan)
+    for row in table.itertuples(index=False):
+        lookup[game_states.index(row[0]), game_states.index(row[1])] = row[2:]
+    return lookup
+
+
+def predict_game_outcome_many(scores):
+    """
+    Inputs: Array-like of shape (games, 3) with the scores of contestant 1, contestant 2 and the returning champion
+    going into Final Jeopardy
+
+    Output: NumPy array of shape (games, 3) with each contestant's win probability, in the same column order.
+    Games whose state pair is missing from win_probability_table are left as NaN.
+    """
+    scores = np.asarray(scores, dtype=float).reshape(-1, 3)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    ranked = np.take_along_axis(scores, order, axis=1)
+    ranked[ranked <= 0] = 1
+
+    first_state = return_state_many(ranked[:, 0], ranked[:, 1])
+    second_state = return_state_many(ranked[:, 1], ranked[:, 2])
+    ranked_probabilities = load_win_probability_table()[first_state, second_state]
+
+    probabilities = np.empty_like(ranked_probabilities)
+    np.put_along_axis(probabilities, order, ranked_probabilities, axis=1)
+    return probabilities
+
+
 def predict_game_outcome(s1, s2, s3):
     data = pd.Series(
         data=[s1, s2, s3], index=["Contestant 1", "Contestant 2", "Returning Champion"]
     ).sort_values(ascending=False)
-    data[data <= 0] = 1
 
-    first_state = return_state(data.iloc[0], data.iloc[1])
-    second_state = return_state(data.iloc[1], data.iloc[2])
+    probabilities = pd.Series(
+        predict_game_outcome_many([[s1, s2, s3]])[0],
+        index=["Contestant 1", "Contestant 2", "Returning Champion"],
+    )
 
-    conn = psycopg2.connect(database_url)
-    cur = conn.cursor()
-    query = f"""SELECT "First Place" , "Second Place" , "Third Place" FROM  win_probability_table where first_state = '{first_state}' and second_state = '{second_state}'"""
-    cur.execute(query)
-    results = cur.fetchall()
-    probabilities = pd.DataFrame(
-        results, columns=["First Place", "Second Place", "Third Place"]
-    ).T
+    return probabilities[data.index]
 
-    conn.close()
-    cur.close()
 
-    probabilities.index = data.index
-    probabilities = probabilities.squeeze()
+game_states = [
+    "Tied",
+    "Locked",
+    "Lock Tie",
+    "Crush",
+    "Two Thirds",
+    "Three Fourths",
+    "Four Fifths",
+]
 
-    return probabilities
+
+def is_locked_many(scores, remaining_value, remaining_dds):
+    """
+    Inputs: Array-like of shape (states, 3) with the contestants' scores, and the remaining clue value and number of
+    daily doubles for each state
+
+    Output: NumPy int8 array that is 1 where the leader cannot be caught before Final Jeopardy and 0 otherwise.
+    """
+    scores = np.asarray(scores, dtype=float).reshape(-1, 3)
+    ranked = np.partition(scores, 1, axis=1)
+    first, second = ranked[:, 2], ranked[:, 1]
+    locked = first > (second + np.asarray(remaining_value, dtype=float)) * np.power(
+        2.0, 1 + np.asarray(remaining_dds, dtype=float)
+    )
+    return locked.astype(np.int8)
 
 
 def is_locked(s1, s2, s3, rv, rdds):
-    scores = [s1, s2, s3]
-    scores.sort()
-    a, b = scores[-1], scores[-2]
-    if a > ((b + rv) * 2 ** (1 + rdds)):
-        return 1
-    else:
-        return 0
+    return int(is_locked_many([[s1, s2, s3]], rv, rdds)[0])
+
+
+def return_state_many(score_1, score_2):
+    """
+    Inputs: Arrays of the higher and the lower of two scores
+
+    Output: NumPy int8 array of codes into game_states describing how close the lower score is to the higher one.
+    """
+    score_ratio = np.asarray(score_2, dtype=float) / np.asarray(score_1, dtype=float)
+    return np.select(
+        [
+            score_ratio == 1,
+            score_ratio < 0.5,
+            score_ratio == 0.5,
+            score_ratio < (2 / 3),
+            score_ratio < (3 / 4),
+            score_ratio < (4 / 5),
+        ],
+        [0, 1, 2, 3, 4, 5],
+        default=6,
+    ).astype(np.int8)
 
 
 def return_state(score_1, score_2):
-    score_ratio = score_2 / score_1
-    if score_ratio == 1:
-        return "Tied"
-    elif score_ratio < 0.5:
-        return "Locked"
-    elif score_ratio == 0.5:
-        return "Lock Tie"
-    elif (score_ratio > 0.5) & (score_ratio < (2 / 3)):
-        return "Crush"
-    elif (score_ratio >= (2 / 3)) & (score_ratio < (3 / 4)):
-        return "Two Thirds"
-    elif (score_ratio >= (3 / 4)) & (score_ratio < (4 / 5)):
-        return "Three Fourths"
-    else:
-        return "Four Fifths"
+    return game_states[int(return_state_many(score_1, score_2))]
+
+
+@cached
+def load_board_cube():
+    """
+    Output: Dictionary with the sorted air dates of board_cube and fj_cube and, for each partial sum, a NumPy array
+    of prefix sums over those dates (the first entry is all zeros). Board arrays have shape (dates + 1, 2, 5, 6) for
+    the Jeopardy and Double Jeopardy rounds, rows and columns. Read once per process and read again when the data
+    version changes, so a rebuilt cube is picked up.
+    """
+    board = read_sql(
+        """SELECT air_date, round_id, row_id, category_column, n_clues, n_correct, n_dd, ev_sum, ev_count
+        FROM board_cube WHERE row_id between 1 and 5 and category_column between 1 and 6"""
+    )
+    fj = read_sql("SELECT air_date, n_shows, n_correct, n_clues FROM fj_cube")
+
+    dates = np.unique(
+        np.concatenate(
+            (
+                pd.to_datetime(board["air_date"]).to_numpy("datetime64[D]"),
+                pd.to_datetime(fj["air_date"]).to_numpy("datetime64[D]"),
+            )
+        )
+    )
+    board_dates = np.searchsorted(
+        dates, pd.to_datetime(board["air_date"]).to_numpy("datetime64[D]")
+    )
+    rounds = np.where(board["round_id"] == "J", 0, 1)
+    rows = board["row_id"].to_numpy(dtype=int) - 1
+    columns = board["category_column"].to_numpy(dtype=int) - 1
+
+    cube = {"dates": dates}
+    for statistic in ["n_clues", "n_correct", "n_dd", "ev_sum", "ev_count"]:
+        totals = np.zeros((len(dates) + 1, 2, 5, 6))
+        np.add.at(
+            totals,
+            (board_dates + 1, rounds, rows, columns),
+            board[statistic].to_numpy(dtype=float),
+        )
+        cube[statistic] = np.cumsum(totals, axis=0)
+
+    fj_dates = np.searchsorted(
+        dates, pd.to_datetime(fj["air_date"]).to_numpy("datetime64[D]")
+    )
+    first_rows = ~fj.duplicated("air_date").to_numpy()
+    shows = np.zeros(len(dates) + 1)
+    shows[fj_dates[first_rows] + 1] = fj["n_shows"].to_numpy(dtype=float)[first_rows]
+    cube["n_shows"] = np.cumsum(shows)
+
+    answered = fj["n_correct"].notna().to_numpy()
+    n_correct = fj["n_correct"][answered].to_numpy(dtype=int)
+    fj_clues = np.zeros((len(dates) + 1, n_correct.max(initial=0) + 1))
+    np.add.at(
+        fj_clues,
+        (fj_dates[answered] + 1, n_correct),
+        fj["n_clues"][answered].to_numpy(dtype=float),
+    )
+    cube["fj_clues"] = np.cumsum(fj_clues, axis=0)
+
+    return cube
+
+
+def board_statistics(start_date, end_date):
+    """
+    Inputs: First and last air date of the range, as strings or dates
+
+    Output: Arrays of shape (2, 5, 6) with the percent of clues answered correctly, the percent chance of holding the
+    round's daily double and the expected value of every board cell, and a DataFrame of Final Jeopardy results by
+    number of correct contestants, or None when the range ends after the last date in the cube.
+    """
+    cube = load_board_cube()
+    start_date = np.datetime64(pd.Timestamp(start_date).date(), "D")
+    end_date = np.datetime64(pd.Timestamp(end_date).date(), "D")
+    if len(cube["dates"]) == 0 or end_date > cube["dates"][-1]:
+        return None
+
+    first = np.searchsorted(cube["dates"], start_date, side="left")
+    last = np.searchsorted(cube["dates"], end_date, side="right")
+    totals = {
+        statistic: values[last] - values[first]
+        for statistic, values in cube.items()
+        if statistic != "dates"
+    }
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent_correct = 100 * totals["n_correct"] / totals["n_clues"]
+        percent_dd = (
+            100 * totals["n_dd"] / totals["n_dd"].sum(axis=(1, 2), keepdims=True)
+        )
+        expected_value = totals["ev_sum"] / totals["ev_count"]
+        fj_percent = 100 * totals["fj_clues"] / totals["n_shows"]
+
+    fj_results = pd.DataFrame(
+        {
+            "Number of Correct Contestants": np.arange(len(totals["fj_clues"])),
+            "Number of Clues": totals["fj_clues"].astype(int),
+            "Percent of Clues": fj_percent,
+        }
+    )
+    fj_results = fj_results[fj_results["Number of Clues"] > 0].reset_index(drop=True)
+
+    return percent_correct, percent_dd, expected_value, fj_results
+
+
+@cached
+def load_champion_stats():
+    """
+    Output: Dictionary with the champion_stats table indexed by contestant (ordered by winnings, highest first), the
+    median streak, winnings and average winnings of all champions, and (counts, bin edges) histograms of the streaks
+    and winnings. Read once per process and read again when the data version changes.
+    """
+    table = read_sql(
+        """SELECT contestant, streak, winnings, average_winnings, percent_correct, response_accuracy, fj_accuracy
+        FROM champion_stats ORDER BY winnings desc"""
+    ).set_index("contestant")
+
+    # Streaks are whole games, so each bar covers a single streak length
+    streaks = table["streak"].to_numpy(dtype=float)
+    streak_edges = np.arange(streaks.min(initial=1), streaks.max(initial=1) + 2) - 0.5
+    winnings = table["winnings"].to_numpy(dtype=float)
+
+    return {
+        "table": table,
+        "medians": table[["streak", "winnings", "average_winnings"]].median(),
+        "histograms": {
+            "streak": np.histogram(streaks, bins=streak_edges),
+            "winnings": np.histogram(winnings, bins="auto"),
+        },
+    }
+
+
+@cached
+def champion_options():
+    """
+    Output: Names of the returning champions, highest winnings first, for the Champions dropdown
+    """
+    return list(load_champion_stats()["table"].index)
 
 
 def fj_result(show_number):
-    conn = psycopg2.connect(database_url)
-    cur = conn.cursor()
-    query = f"""SELECT COUNT(order_number) + 1 "question_number", 0 "remaining_value", contestant_1_score, contestant_2_score, returning_champion_score 
-    FROM games_view g
-    LEFT JOIN clues_view c using(show_number)
-    where regular_season = true and g.show_number = {show_number} and c.order_number not in ('FJ', 'TB') and winning_contestant <> 'Tied'
-    GROUP BY  g.show_number, contestant_1_score, contestant_2_score, returning_champion_score, winning_contestant 
-        """
-    cur.execute(query)
-    results = cur.fetchall()
+    bundle = load_game(show_number)
+    game = bundle.game
+    regular_clues = bundle.clues["round_id"].isin(["J", "DJ"])
+
     final = pd.DataFrame(
-        results,
         columns=[
             "question_number",
             "remaining_value",
             "contestant_1_score",
             "contestant_2_score",
             "returning_champion_score",
-        ],
+        ]
     )
-    cur.close()
-    conn.close()
+    if (
+        game["regular_season"] == True
+        and pd.notna(game["winning_contestant"])
+        and game["winning_contestant"] != "Tied"
+        and regular_clues.any()
+    ):
+        final.loc[0] = [
+            regular_clues.sum() + 1,
+            0,
+            game["contestant_1_score"],
+            game["contestant_2_score"],
+            game["returning_champion_score"],
+        ]
+        final = final.infer_objects()
 
     final.reset_index(drop=True, inplace=True)
     scores = pd.Series(
@@ -453,63 +971,35 @@ def final_model_plot_data(show_number):
     return return_data
 
 
-def final_model(show_number):
-    lr = load("JeopardyDashboard/logistic_regression.joblib")
+@lru_cache(maxsize=None)
+def load_model():
+    return load(model_path)
+
 
+def final_model(show_number):
     dff = game_progression_win_probability(show_number)
-    dff["is_locked"] = dff.apply(
-        lambda x: is_locked(
-            x["contestant_1_score"],
-            x["contestant_2_score"],
-            x["returning_champion_score"],
-            x["remaining_value"],
-            x["remaining_dds"],
-        ),
-        axis=1,
-    )
-
-    final_predictions = pd.DataFrame()
-    for row in dff.itertuples():
-        if row.is_locked == 1:
-            scores = pd.Series(
-                [
-                    row.contestant_1_score,
-                    row.contestant_2_score,
-                    row.returning_champion_score,
-                ],
-                index=["contestant_1", "contestant_2", "returning_champion"],
-            )
-            scores = scores.apply(lambda x: 1 if x == scores.max() else 0)
-            predictions = pd.DataFrame(scores).T
-        elif row.question_number == dff["question_number"].max():
-            predictions = (
-                pd.DataFrame(
-                    predict_game_outcome(
-                        row.contestant_1_score,
-                        row.contestant_2_score,
-                        row.returning_champion_score,
-                    )
-                )
-                .sort_index()
-                .T
-            )
-            predictions.columns = ["contestant_1", "contestant_2", "returning_champion"]
-        else:
-            scores_array = np.array(
-                [
-                    [
-                        row.contestant_1_score,
-                        row.contestant_2_score,
-                        row.returning_champion_score,
-                        row.remaining_value,
-                    ]
-                ]
-            )
-            predictions = pd.DataFrame(lr.predict_proba(scores_array))
-            predictions.columns = ["contestant_1", "contestant_2", "returning_champion"]
-        final_predictions = pd.concat([final_predictions, predictions])
+    scores = dff[
+        ["contestant_1_score", "contestant_2_score", "returning_champion_score"]
+    ].to_numpy()
+    dff["is_locked"] = is_locked_many(
+        scores, dff["remaining_value"].to_numpy(), dff["remaining_dds"].to_numpy()
+    )
+    locked = (dff["is_locked"] == 1).to_numpy()
+    last_clue = (dff["question_number"] == dff["question_number"].max()).to_numpy()
+    last_clue &= ~locked
+    modelled = ~locked & ~last_clue
+
+    predictions = np.zeros((len(dff), 3))
+    if modelled.any():
+        features = np.column_stack((scores, dff["remaining_value"].to_numpy()))
+        predictions[modelled] = load_model().predict_proba(features[modelled])
+
+    # A locked game is already decided, so every contestant holding the top score wins.
+    locked_scores = scores[locked]
+    predictions[locked] = locked_scores == locked_scores.max(axis=1, keepdims=True)
+
+    predictions[last_clue] = predict_game_outcome_many(scores[last_clue])
 
-    final_predictions = final_predictions.reset_index().drop(["index"], axis=1)
     dff.reset_index(inplace=True, drop=True)
-    return_data_test = dff.merge(final_predictions, left_index=True, right_index=True)
-    return return_data_test
+    dff[contestant_columns] = predictions
+    return dff
@@ -0,0 +1,386 @@
+import argparse
+import gzip
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import brotli
+import numpy as np
+
+from JeopardyBenchmark import Inputs
+
+# Replays user sessions against the Dash callback endpoint, the same requests a browser sends: a page load is the
+# index request followed by the pages routing callback (which builds the page layout), and every later interaction
+# is a /_dash-update-component request built from the app's /_dash-dependencies. Against app.server in this process
+# the harness behaves like one worker running --concurrency threads; pass --url to load a running server instead.
+# Arguments are drawn from the archive in the database of database_url_jeopardy, which must be the one the server
+# reads.
+
+
+def _split_outputs(output):
+    # Dash names multiple outputs "..a.children...b.figure.." and a single one "a.children"
+    if output.startswith(".."):
+        return output[2:-2].split("...")
+    return [output]
+
+
+class _Target:
+    """
+    Sends requests to app.server in this process, through one Flask test client per thread, or to the server at url,
+    through one requests session per thread.
+    """
+
+    def __init__(self, url=None):
+        self.url = url.rstrip("/") if url else None
+        self._local = threading.local()
+        if self.url is None:
+            import app
+
+            self.server = app.server
+
+    def _client(self):
+        if not hasattr(self._local, "client"):
+            if self.url is None:
+                self._local.client = self.server.test_client()
+            else:
+                import requests
+
+                self._local.client = requests.Session()
+        return self._local.client
+
+    def request(self, method, path, body=None):
+        """
+        Output: Status code and decoded body of the response
+        """
+        # Responses are compressed as they are for a browser
+        headers = {"Accept-Encoding": "br, gzip"}
+        if self.url is not None:
+            response = self._client().request(
+                method, self.url + path, json=body, headers=headers, timeout=60
+            )
+            return response.status_code, response.content
+
+        response = self._client().open(path, method=method, json=body, headers=headers)
+        data = response.get_data()
+        encoding = response.headers.get("Content-Encoding")
+        if encoding == "br":
+            data = brotli.decompress(data)
+        elif encoding == "gzip":
+            data = gzip.decompress(data)
+        return response.status_code, data
+
+
+class _Callbacks:
+    """
+    Builds /_dash-update-component request bodies for the callbacks the app declares.
+    """
+
+    def __init__(self, target):
+        # The pages routing callback is only registered once the app has served a request
+        target.request("GET", "/")
+        status, data = target.request("GET", "/_dash-dependencies")
+        self.dependencies = {}
+        for dependency in json.loads(data):
+            if dependency.get("clientside_function"):
+                continue
+            for output in _split_outputs(dependency["output"]):
+                self.dependencies[output] = dependency
+
+    def body(self, output, values):
+        """
+        Inputs: One output of the callback ("id.property") and a dictionary of input and state values keyed the same
+        way; the inputs in values are the ones reported as changed
+
+        Output: Request body for /_dash-update-component
+        """
+        dependency = self.dependencies[output]
+        outputs = [
+            dict(zip(["id", "property"], name.rsplit(".", 1)))
+            for name in _split_outputs(dependency["output"])
+        ]
+
+        def with_values(dependencies):
+            return [
+                {**item, "value": values.get(f"{item['id']}.{item['property']}")}
+                for item in dependencies
+            ]
+
+        return {
+            "output": dependency["output"],
+            "outputs": outputs if dependency["output"].startswith("..") else outputs[0],
+            "inputs": with_values(dependency["inputs"]),
+            "state": with_values(dependency["state"]),
+            "changedPropIds": [
+                f"{item['id']}.{item['property']}"
+                for item in dependency["inputs"]
+                if f"{item['id']}.{item['property']}" in values
+            ],
+        }
+
+
+class _Session:
+    def __init__(self, harness, inputs, think_time):
+        self.harness = harness
+        self.inputs = inputs
+        self.rng = inputs.rng
+        self.think_time = think_time
+
+    def request(self, name, method, path, body=None):
+        start = time.perf_counter()
+        try:
+            status, data = self.harness.target.request(method, path, body)
+        except Exception:
+            status, data = None, None
+        self.harness.record(
+            name, time.perf_counter() - start, status is not None and status < 400
+        )
+        if self.think_time:
+            time.sleep(self.rng.exponential(self.think_time))
+        return json.loads(data) if status == 200 and body is not None else None
+
+    def callback(self, name, output, values):
+        return self.request(
+            name,
+            "POST",
+            "/_dash-update-component",
+            self.harness.callbacks.body(output, values),
+        )
+
+    def page(self, path):
+        self.request("index", "GET", path)
+        self.callback(
+            f"page {path}",
+            "_pages_content.children",
+            {"_pages_location.pathname": path, "_pages_location.search": ""},
+        )
+
+    def draws(self, most):
+        return range(int(self.rng.integers(1, most + 1)))
+
+
+def visualizations_session(session):
+    session.page("/")
+    start, end = "2001-11-26", str(session.inputs.last_date.date())
+    for _ in session.draws(3):
+        session.callback(
+            "Visualizations.plot_prob_correct",
+            "answer-correct-graph.figure",
+            {"air-date-range.start_date": start, "air-date-range.end_date": end},
+        )
+        start, end = session.inputs.date_range()
+
+
+def games_session(session):
+    session.page("/GameSummary")
+    for _ in session.draws(3):
+        show = session.inputs.show()
+        # Searching by the start of a show number or a contestant's first name, then picking the show
+        search = (
+            str(show)[:3]
+            if session.rng.random() < 0.5
+            else session.inputs.champion().split()[0]
+        )
+        session.callback(
+            "Games.search_show_options",
+            "show-number.options",
+            {"show-number.search_value": search},
+        )
+        session.callback(
+            "Games.get_data", "output-content2.children", {"show-number.value": show}
+        )
+
+
+def win_probability_session(session):
+    session.page("/WinProbability")
+    for _ in session.draws(3):
+        session.callback(
+            "Win Probability.get_data",
+            "win-probability-graph.figure",
+            {"win-probability-show.value": session.inputs.show()},
+        )
+
+
+def clue_search_session(session):
+    session.page("/ClueSearch")
+    search = {
+        "clue-input.value": session.inputs.term(),
+        "search.value": str(session.rng.choice(["Clue", "Category"])),
+        "search-type.value": "Contains",
+    }
+    table = {
+        "clue-table.page_current": 0,
+        "clue-table.page_size": 12,
+        "clue-table.sort_by": [],
+        "clue-table.filter_query": "",
+    }
+    session.callback("Clue Search.filter_clues", "output-content.children", search)
+    session.callback("Clue Search.page_clues", "clue-table.data", {**search, **table})
+    for page in session.draws(2):
+        table["clue-table.page_current"] = page + 1
+        session.callback(
+            "Clue Search.page_clues", "clue-table.data", {**search, **table}
+        )
+
+
+def champions_session(session):
+    session.page("/Champions")
+    for _ in session.draws(3):
+        session.callback(
+            "Champions.get_champions",
+            "win-streak-hist.figure",
+            {"champion-select.value": session.inputs.champion()},
+        )
+
+
+def category_exploration_session(session):
+    session.page("/CategoryExploration")
+    dates = {
+        "air-date-range-category-exploration.start_date": "1984-09-10",
+        "air-date-range-category-exploration.end_date": str(
+            session.inputs.last_date.date()
+        ),
+    }
+    search = {
+        "clue-input-eda.value": "",
+        "search-eda.value": "Category",
+        "offset.value": 0,
+        **dates,
+    }
+    response = session.callback(
+        "Category Exploration.plot_categories", "bar-graph-top.figure", search
+    )
+    session.callback(
+        "Category Exploration.update",
+        "clickdata-clues.children",
+        {"bar-graph-top.clickData": None, "search-eda.value": "Category", **dates},
+    )
+    # Clicking one of the plotted categories
+    if response is not None:
+        categories = response["response"]["bar-graph-top"]["figure"]["data"][0]["y"]
+        click = {"points": [{"y": str(session.rng.choice(categories))}]}
+        session.callback(
+            "Category Exploration.update",
+            "clickdata-clues.children",
+            {"bar-graph-top.clickData": click, "search-eda.value": "Category", **dates},
+        )
+
+
+# Sessions and how often they are picked
+sessions = {
+    visualizations_session: 3,
+    games_session: 2,
+    win_probability_session: 1,
+    clue_search_session: 2,
+    champions_session: 1,
+    category_exploration_session: 1,
+}
+
+
+class Harness:
+    """
+    Runs sessions from concurrent threads against a target and records the latency of every request by name.
+    """
+
+    def __init__(self, url=None):
+        self.target = _Target(url)
+        self.callbacks = _Callbacks(self.target)
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            self.errors[name] = self.errors.get(name, 0) + (not ok)
+
+    def worker(self, seed, deadline, think_time):
+        inputs = Inputs(seed)
+        weights = np.array(list(sessions.values()), dtype=float)
+        while time.perf_counter() < deadline:
+            session = list(sessions)[
+                inputs.rng.choice(len(sessions), p=weights / weights.sum())
+            ]
+            session(_Session(self, inputs, think_time))
+
+    def run(self, concurrency, duration, seed=0, think_time=0):
+        """
+        Inputs: Number of concurrent users, seconds to start sessions for, seed and average pause between requests
+
+        Output: Report dictionary (see report)
+        """
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(self.worker, [seed, user], start + duration, think_time)
+                for user in range(concurrency)
+            ]
+            for future in futures:
+                future.result()
+        return self.report(time.perf_counter() - start)
+
+    def report(self, elapsed):
+        """
+        Output: Dictionary with the throughput, latency percentiles and error rate of every request name and in total
+        """
+        with self._lock:
+            latencies = {name: list(values) for name, values in self.latencies.items()}
+            errors = dict(self.errors)
+        latencies["total"] = [
+            value for values in latencies.values() for value in values
+        ]
+        errors["total"] = sum(errors.values())
+
+        report = {"seconds": round(elapsed, 1), "requests": {}}
+        for name, values in sorted(latencies.items()):
+            milliseconds = 1000 * np.array(values)
+            report["requests"][name] = {
+                "count": len(values),
+                "per_second": round(len(values) / elapsed, 2),
+                "p50_ms": round(float(np.percentile(milliseconds, 50)), 1),
+                "p95_ms": round(float(np.percentile(milliseconds, 95)), 1),
+                "p99_ms": round(float(np.percentile(milliseconds, 99)), 1),
+                "error_rate": round(errors[name] / len(values), 4),
+            }
+        return report
+
+
+def print_report(report):
+    print(
+        f"{'request':<40}{'count':>7}{'per s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+    )
+    for name, row in report["requests"].items():
+        print(
+            f"{name:<40}{row['count']:>7}{row['per_second']:>8.2f}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}"
+            f"{row['p99_ms']:>9.1f}{row['error_rate']:>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay concurrent user sessions against the dashboard's callbacks."
+    )
+    parser.add_argument(
+        "--url", help="running server to load, app.server in this process by default"
+    )
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent users")
+    parser.add_argument(
+        "--duration", type=float, default=30, help="seconds to start new sessions for"
+    )
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=0,
+        help="average seconds a user waits between requests",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    report = Harness(args.url).run(
+        args.concurrency, args.duration, args.seed, args.think_time
+    )
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=1)
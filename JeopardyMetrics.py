@@ -0,0 +1,264 @@
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import dash
+from flask import Response, g, jsonify, request
+
+# Routes under /_debug expose internal statistics, so they are only registered when this is set
+debug_routes = os.getenv("jeopardy_debug_routes", "").lower() in ("1", "true", "yes")
+# Route serving the timing histograms in the Prometheus text format; empty to not serve them
+metrics_route = os.getenv("jeopardy_metrics_route", "/metrics")
+# Requests taking longer than this are logged as one JSON line with their query and figure timings
+slow_request_ms = float(os.getenv("jeopardy_slow_request_ms", 1000))
+
+# Upper bounds in seconds of the histogram buckets (the Prometheus client's defaults)
+buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Timing histograms, with the label that tells their series apart and their help text
+histograms = {
+    "callback": ("callback", "Seconds to answer a Dash callback request"),
+    "query": ("caller", "Seconds to run a SQL statement, by the function issuing it"),
+    "figure": ("figure", "Seconds to build Plotly figures"),
+}
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_payloads = {}
+_series = {histogram: {} for histogram in histograms}
+_callback_labels = {}
+# Query and figure timings of the request being handled. Query threads run in a copy of the requesting context,
+# so their timings are added to the same dictionary.
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def callback_name():
+    """
+    Output: The outputs of the Dash callback the current request updates, as Dash names them (e.g. "fj-graph.figure"),
+    or None when the request is not a callback.
+    """
+    if not request.path.endswith("/_dash-update-component"):
+        return None
+    body = request.get_json(silent=True) or {}
+    return body.get("output")
+
+
+def _label(function):
+    return f"{function.__module__.removeprefix('pages.')}.{function.__qualname__}"
+
+
+def callback_label(output):
+    """
+    Output: The module and name of the function answering the Dash callback with these outputs (e.g.
+    "Games.get_data"), or the outputs themselves for callbacks Dash defines
+    """
+    if output not in _callback_labels:
+        function = dash.get_app().callback_map.get(output, {}).get("callback")
+        if function is None or function.__module__.startswith("dash"):
+            _callback_labels[output] = output
+        else:
+            _callback_labels[output] = _label(function)
+    return _callback_labels[output]
+
+
+def observe(histogram, label, seconds):
+    """
+    Adds a timing to the series of one of the histograms, and to the timings of the current request.
+    """
+    with _lock:
+        series = _series[histogram].get(label)
+        if series is None:
+            series = _series[histogram][label] = {
+                "buckets": [0] * (len(buckets) + 1),
+                "sum": 0.0,
+            }
+        series["buckets"][bisect.bisect_left(buckets, seconds)] += 1
+        series["sum"] += seconds
+        timings = _request_timings.get()
+        if timings is not None and histogram in timings:
+            timings[histogram]["count"] += 1
+            timings[histogram]["ms"] += 1000 * seconds
+
+
+@contextmanager
+def timer(histogram, label):
+    """
+    Times the body of a with statement into one of the histograms.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(histogram, label, time.perf_counter() - start)
+
+
+def timed(histogram):
+    """
+    Decorator timing every call of a function into one of the histograms, labelled with its module and name.
+    """
+
+    def decorator(function):
+        label = _label(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(histogram, label):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _start_request():
+    g.jeopardy_request_start = time.perf_counter()
+    g.jeopardy_timings = {
+        "query": {"count": 0, "ms": 0.0},
+        "figure": {"count": 0, "ms": 0.0},
+    }
+    _request_timings.set(g.jeopardy_timings)
+
+
+def _finish_request(response):
+    start = g.pop("jeopardy_request_start", None)
+    if start is None:
+        return response
+    seconds = time.perf_counter() - start
+    output = callback_name()
+    callback = None if output is None else callback_label(output)
+    if callback is not None:
+        observe("callback", callback, seconds)
+    if 1000 * seconds >= slow_request_ms:
+        timings = g.jeopardy_timings
+        logger.warning(
+            json.dumps(
+                {
+                    "event": "slow_request",
+                    "method": request.method,
+                    "path": request.path,
+                    "callback": callback,
+                    "status": response.status_code,
+                    "ms": round(1000 * seconds, 1),
+                    "queries": timings["query"]["count"],
+                    "query_ms": round(timings["query"]["ms"], 1),
+                    "figures": timings["figure"]["count"],
+                    "figure_ms": round(timings["figure"]["ms"], 1),
+                }
+            )
+        )
+    return response
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def metrics_text():
+    """
+    Output: The timing histograms in the Prometheus text exposition format
+    """
+    with _lock:
+        series = {
+            histogram: {
+                label: dict(values, buckets=list(values["buckets"]))
+                for label, values in labels.items()
+            }
+            for histogram, labels in _series.items()
+        }
+    lines = []
+    for histogram, (label_name, help_text) in histograms.items():
+        name = f"jeopardy_{histogram}_seconds"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for label, values in sorted(series[histogram].items()):
+            label = f'{label_name}="{_escape(label)}"'
+            count = 0
+            for bound, bucket in zip([*buckets, "+Inf"], values["buckets"]):
+                count += bucket
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f"{name}_sum{{{label}}} {values['sum']}")
+            lines.append(f"{name}_count{{{label}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def _record_payload(name, size, sent):
+    with _lock:
+        payload = _payloads.setdefault(
+            name, {"requests": 0, "bytes": 0, "sent_bytes": 0, "max_bytes": 0}
+        )
+        payload["requests"] += 1
+        payload["bytes"] += size
+        payload["sent_bytes"] += sent
+        payload["max_bytes"] = max(payload["max_bytes"], size)
+
+
+def _measure_payload(response):
+    output = callback_name()
+    if output is None or response.status_code != 200 or response.is_streamed:
+        return response
+    # Keyed like the callback histogram, so the two reports can be joined per callback
+    name = callback_label(output)
+    # This runs before the response is compressed, and the close callback after, so both sizes are seen
+    size = response.content_length or 0
+    response.call_on_close(
+        lambda: _record_payload(name, size, response.content_length or 0)
+    )
+    return response
+
+
+def payload_report():
+    """
+    Output: List with one dictionary per callback holding its request count and its average and largest response
+    size before compression, and its average size as sent, largest callbacks first.
+    """
+    with _lock:
+        payloads = {name: dict(payload) for name, payload in _payloads.items()}
+    report = [
+        {
+            "callback": name,
+            "requests": payload["requests"],
+            "avg_bytes": payload["bytes"] // payload["requests"],
+            "max_bytes": payload["max_bytes"],
+            "avg_sent_bytes": payload["sent_bytes"] // payload["requests"],
+            "compression_ratio": round(
+                payload["bytes"] / max(payload["sent_bytes"], 1), 2
+            ),
+        }
+        for name, payload in payloads.items()
+    ]
+    return sorted(report, key=lambda row: row["avg_bytes"], reverse=True)
+
+
+def instrument(server):
+    """
+    Registers the request hooks that time requests and measure callback responses on the Flask server, and the
+    metrics route. Must be called after response compression is set up so that the uncompressed size is measured
+    first.
+    """
+    server.before_request(_start_request)
+    server.after_request(_measure_payload)
+    server.after_request(_finish_request)
+    if metrics_route:
+        server.add_url_rule(
+            metrics_route,
+            "metrics",
+            lambda: Response(metrics_text(), mimetype="text/plain; version=0.0.4"),
+        )
+    if debug_routes:
+        server.add_url_rule(
+            "/_debug/payloads", "debug_payloads", lambda: jsonify(payload_report())
+        )
+        # JeopardyDatabase reports its timings through this module, so it is imported here rather than at the top
+        from JeopardyDatabase import slow_query_report
+
+        server.add_url_rule(
+            "/_debug/slow-queries",
+            "debug_slow_queries",
+            lambda: jsonify(slow_query_report()),
+        )
@@ -0,0 +1,420 @@
+import argparse
+import csv
+import datetime
+import io
+
+import numpy as np
+
+import JeopardyDatabase
+from JeopardyBuild import build, build_steps, run_statements, search_index_statements
+from JeopardyDatabase import connection, read_value
+from JeopardyFunctions import game_states, return_state_many
+
+# A synthetic archive with the schema of the production database, so every page and function can be run and
+# benchmarked without it. Games follow the rules of the show: clue values double on November 26 2001, one daily double
+# in the Jeopardy round and two in different categories of the Double Jeopardy round, wagered by the contestant in
+# control, champions retire after five wins until September 8 2003, only contestants with a positive score play Final
+# Jeopardy, ties go to a tiebreaker clue from 2014 on, and each season ends with a tournament. Responses refer to
+# contestants by nickname, which are first names that can repeat within a game, as on the real boards.
+schema_statements = [
+    "DROP TABLE IF EXISTS clues_view, games_view, contestants, win_probability_table CASCADE",
+    """CREATE TABLE games_view (
+        show_number int, air_date timestamp, contestant_1 text, contestant_2 text, returning_champion text,
+        contestant_1_nickname text, contestant_2_nickname text, returning_champion_nickname text,
+        contestant_1_score int, contestant_2_score int, returning_champion_score int, winning_contestant text,
+        regular_season bool, returning_champion_streak int, returning_champion_winnings int, game_comments text
+    )""",
+    """CREATE TABLE clues_view (
+        show_number int, air_date timestamp, round_id text, order_number text, category_column int, row_id int,
+        category text, clue text, correct_response text, clue_value int, value text, is_dd bool,
+        n_correct int, n_incorrect int, correct_contestants text, incorrect_contestants text
+    )""",
+    "CREATE TABLE contestants (contestant text, contestant_nickname text, show_number int)",
+    """CREATE TABLE win_probability_table (
+        first_state text, second_state text, "First Place" float, "Second Place" float, "Third Place" float
+    )""",
+    "CREATE INDEX clues_view_show_number ON clues_view (show_number)",
+    "CREATE INDEX games_view_show_number ON games_view (show_number)",
+    "CREATE INDEX contestants_contestant ON contestants (contestant)",
+]
+
+first_names = (
+    "Ken, Brad, James, Amy, Matt, Mattea, Anna, Ann, Jo, Joe, Lisa, Sam, Mary Beth, Al, Alan, Eve, Tom, "
+    "Tommy, Ray, Rachel, David, Dave, Julia, Jules, Larry, Cindy, Buzzy, Roger, Emma, Ryan, Victoria, Mike, "
+    "Priya, Andrew, Yogesh, Troy, Jason, Arthur, Cris, Ben"
+).split(", ")
+last_names = (
+    "Jennings, Rutter, Holzhauer, Schneider, Amodio, Roach, Smith, Lee, Chu, Groce, Cohen, Craig, Kavanaugh, "
+    "Donovan, Patel, Nguyen, Garcia, Miller, Davis, Lopez, Wilson, Moore, Taylor, Clark, Lewis, Walker, Hall, "
+    "Young, King, Wright, Scott, Green, Baker, Adams"
+).split(", ")
+category_stems = (
+    "SCIENCE, HISTORY, WORLD HISTORY, POTPOURRI, U.S. CITIES, OPERA, BEFORE & AFTER, WORD ORIGINS, SPORTS, "
+    "LITERATURE, BODIES OF WATER, ART, FOOD, RHYME TIME, STUPID ANSWERS, THE BIBLE, STATE CAPITALS, "
+    "SHAKESPEARE, ANAGRAMS, U.S. PRESIDENTS, POETRY, MYTHOLOGY, BUSINESS & INDUSTRY"
+).split(", ")
+category_modifiers = [
+    "",
+    "FAMOUS ",
+    "19th CENTURY ",
+    "AMERICAN ",
+    "WORLD ",
+    "ANCIENT ",
+    "MODERN ",
+    "LITTLE-KNOWN ",
+]
+words = (
+    "history, river, painter, novel, king, element, planet, composer, island, treaty, poet, mountain, empire, "
+    "inventor, saint, dynasty, opera, capital, desert, senator, bird, battle"
+).split(", ")
+
+seasons_shows = 230
+tournament_shows = 10
+# Chance of a daily double being in each row of the board, top to bottom
+daily_double_rows = [0.005, 0.09, 0.27, 0.39, 0.245]
+doubled_values_date = datetime.datetime(2001, 11, 26)
+unlimited_streaks_date = datetime.datetime(2003, 9, 8)
+tiebreaker_date = datetime.datetime(2014, 1, 1)
+
+
+class _Archive:
+    def __init__(self, seed):
+        self.rng = np.random.default_rng(seed)
+        self.categories = sorted(
+            {m + s for s in category_stems for m in category_modifiers}
+        )
+        self.names = set()
+        self.games, self.clues, self.contestants = [], [], []
+        # Scores before Final Jeopardy and the winning seat of each regular season game, for win_probability_table
+        self.final_states, self.winners = [], []
+
+    def person(self, opponents=()):
+        # Contestants of one game never share a nickname, though one can be part of another's (Ann and Anna)
+        nicknames = {nickname for _, nickname in opponents}
+        while True:
+            first = str(self.rng.choice(first_names))
+            if first in nicknames:
+                continue
+            name = f"{first} {chr(65 + self.rng.integers(26))}. {self.rng.choice(last_names)}"
+            if len(self.names) > 0.9 * 26 * len(first_names) * len(last_names):
+                name = f"{name} {len(self.names)}"
+            if name not in self.names:
+                self.names.add(name)
+                return name, first
+
+    def clue_text(self, show_number, round_id, order_number):
+        first, second = self.rng.choice(words, 2, replace=False)
+        return (
+            f"This {first} is linked to a {second} (show {show_number}, {round_id} {order_number})",
+            f"{str(self.rng.choice(words)).title()} {self.rng.choice(last_names)}",
+        )
+
+    def play_round(self, show_number, day, round_id, seats, scores, control):
+        multiplier = (2 if round_id == "DJ" else 1) * (
+            2 if day >= doubled_values_date else 1
+        )
+        categories = self.rng.choice(self.categories, 6, replace=False)
+
+        dd_columns = self.rng.choice(
+            np.arange(1, 7), 1 if round_id == "J" else 2, replace=False
+        )
+        dd_cells = {
+            (int(column), int(self.rng.choice(np.arange(1, 6), p=daily_double_rows)))
+            for column in dd_columns
+        }
+
+        # Boards are mostly played top to bottom, and some run out of time before every clue is revealed
+        cells = [(column, row) for column in range(1, 7) for row in range(1, 6)]
+        noise = self.rng.normal(0, 1.2, len(cells))
+        cells = [cells[i] for i in np.argsort([row for _, row in cells] + noise)]
+        if self.rng.random() < 0.15:
+            unrevealed = int(self.rng.integers(1, 5))
+            kept = [cell for cell in cells if cell not in dd_cells]
+            cells = [
+                cell for cell in cells if cell in dd_cells or cell in kept[:-unrevealed]
+            ]
+
+        for order_number, (column, row) in enumerate(cells, start=1):
+            clue_value = 100 * multiplier * row
+            correct, incorrect = [], []
+            is_dd = (column, row) in dd_cells
+            if is_dd:
+                limit = max(scores[control], 500 * multiplier)
+                wager = int(limit * self.rng.uniform(0.2, 1.0)) // 100 * 100 or 5
+                if self.rng.random() < 0.65:
+                    correct.append(control)
+                    scores[control] += wager
+                else:
+                    incorrect.append(control)
+                    scores[control] -= wager
+                value = f"DD: ${wager:,}"
+            else:
+                value = f"${clue_value:,}"
+                # Lower rows and the Double Jeopardy round are harder, and fewer contestants ring in
+                harder = 1 if round_id == "DJ" else 0
+                buzz = 0.85 - 0.09 * row - 0.05 * harder
+                accuracy = 0.93 - 0.03 * row - 0.03 * harder
+                for seat in self.rng.permutation(3):
+                    if self.rng.random() >= buzz:
+                        continue
+                    if self.rng.random() < accuracy:
+                        correct.append(int(seat))
+                        scores[seat] += clue_value
+                        break
+                    incorrect.append(int(seat))
+                    scores[seat] -= clue_value
+            if correct:
+                control = correct[0]
+
+            self.clues.append(
+                (
+                    show_number,
+                    day,
+                    round_id,
+                    str(order_number),
+                    column,
+                    row,
+                    categories[column - 1],
+                    *self.clue_text(show_number, round_id, order_number),
+                    clue_value,
+                    value,
+                    is_dd,
+                    len(correct),
+                    len(incorrect),
+                    ", ".join(seats[seat][1] for seat in correct) or None,
+                    ", ".join(seats[seat][1] for seat in incorrect) or None,
+                )
+            )
+        return control
+
+    def final_clue(self, show_number, day, round_id, seats, correct, incorrect):
+        self.clues.append(
+            (
+                show_number,
+                day,
+                round_id,
+                round_id,
+                None,
+                None,
+                str(self.rng.choice(self.categories)),
+                *self.clue_text(show_number, round_id, 1),
+                None,
+                None,
+                False,
+                len(correct),
+                len(incorrect),
+                ", ".join(seats[seat][1] for seat in correct) or None,
+                ", ".join(seats[seat][1] for seat in incorrect) or None,
+            )
+        )
+
+    def play_final(self, show_number, day, seats, scores):
+        leader, second = sorted(scores, reverse=True)[:2]
+        correct, incorrect = [], []
+        for seat in range(3):
+            if scores[seat] <= 0:
+                continue
+            if scores[seat] == leader:
+                # The leader bets to finish ahead of a doubled second place, if they can
+                wager = min(scores[seat], max(0, 2 * second - leader + 1))
+            else:
+                wager = int(self.rng.integers(0, scores[seat] + 1))
+            if self.rng.random() < 0.5:
+                correct.append(seat)
+                scores[seat] += wager
+            else:
+                incorrect.append(seat)
+                scores[seat] -= wager
+        self.final_clue(show_number, day, "FJ", seats, correct, incorrect)
+
+        winners = [seat for seat in range(3) if scores[seat] == max(scores)]
+        if len(winners) > 1 and day >= tiebreaker_date:
+            winner = int(self.rng.choice(winners))
+            self.final_clue(show_number, day, "TB", seats, [winner], [])
+            return winner, winners
+        return (winners[0] if len(winners) == 1 else None), winners
+
+    def generate(self, n_shows, first_show):
+        champion, streak, winnings = None, 0, 0
+        day = datetime.datetime(1984, 9, 7)
+        for show_number in range(1, first_show + n_shows):
+            # Shows air on weekdays from September 10 1984
+            day += datetime.timedelta(days=3 if day.weekday() == 4 else 1)
+            if show_number < first_show:
+                continue
+
+            game_of_season = (show_number - 1) % seasons_shows
+            regular_season = game_of_season < seasons_shows - tournament_shows
+            if regular_season:
+                if champion is None:
+                    champion, streak, winnings = self.person(), 0, 0
+                challenger = self.person([champion])
+                seats = [challenger, self.person([champion, challenger]), champion]
+                comments = None
+            else:
+                seats = []
+                for _ in range(3):
+                    seats.append(self.person(seats))
+                game = game_of_season - (seasons_shows - tournament_shows) + 1
+                comments = f"Tournament of Champions game {game}."
+
+            scores = [0, 0, 0]
+            control = int(self.rng.integers(3))
+            self.play_round(show_number, day, "J", seats, scores, control)
+            self.play_round(
+                show_number, day, "DJ", seats, scores, int(np.argmin(scores))
+            )
+            before_final = list(scores)
+            winner, winners = self.play_final(show_number, day, seats, scores)
+
+            self.games.append(
+                (
+                    show_number,
+                    day,
+                    seats[0][0],
+                    seats[1][0],
+                    seats[2][0],
+                    seats[0][1],
+                    seats[1][1],
+                    seats[2][1],
+                    *scores,
+                    "Tied" if winner is None else seats[winner][0],
+                    regular_season,
+                    streak if regular_season else None,
+                    winnings if regular_season and streak else None,
+                    comments,
+                )
+            )
+            self.contestants.extend(
+                (name, nickname, show_number) for name, nickname in seats
+            )
+
+            if not regular_season:
+                continue
+            if winner is not None:
+                self.final_states.append(before_final)
+                self.winners.append(winner)
+            # A tied champion stays on, otherwise the (first) winner takes over
+            if winner == 2 or (winner is None and 2 in winners):
+                streak, winnings = streak + 1, winnings + scores[2]
+            else:
+                seat = winners[0] if winner is None else winner
+                champion, streak, winnings = seats[seat], 1, scores[seat]
+            if day < unlimited_streaks_date and streak >= 5:
+                champion = None
+
+    def win_probabilities(self):
+        # How often the first, second and third place contestant going into Final Jeopardy won, by game state
+        scores = np.array(self.final_states, dtype=float).reshape(-1, 3)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        ranked = np.take_along_axis(scores, order, axis=1)
+        place = np.argmax(order == np.array(self.winners).reshape(-1, 1), axis=1)
+
+        playable = ranked[:, 0] > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            first_state = return_state_many(ranked[playable, 0], ranked[playable, 1])
+            second_state = return_state_many(ranked[playable, 1], ranked[playable, 2])
+        place = place[playable]
+
+        rows = []
+        for first in range(len(game_states)):
+            for second in range(len(game_states)):
+                games = place[(first_state == first) & (second_state == second)]
+                if len(games):
+                    wins = np.bincount(games, minlength=3) / len(games)
+                    rows.append(
+                        (game_states[first], game_states[second], *map(float, wins))
+                    )
+        return rows
+
+
+def generate(n_shows, seed=0, first_show=1):
+    """
+    Inputs: Number of shows, the seed of the random number generator and the number of the first show. Starting
+    later gives a small archive of recent games, such as the ones the Win Probability model covers.
+
+    Output: Dictionary mapping each base table of the database to a list of row tuples
+    """
+    archive = _Archive(seed)
+    archive.generate(n_shows, first_show)
+    return {
+        "games_view": archive.games,
+        "clues_view": archive.clues,
+        "contestants": archive.contestants,
+        "win_probability_table": archive.win_probabilities(),
+    }
+
+
+def load(tables):
+    """
+    Replaces the base tables of the configured database with the generated ones, copying them in with COPY.
+    """
+    with connection() as conn:
+        cur = conn.cursor()
+        for statement in schema_statements:
+            cur.execute(statement)
+        for table, rows in tables.items():
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cur.copy_expert(f"COPY {table} FROM STDIN WITH (FORMAT csv)", buffer)
+            cur.execute(f"ANALYZE {table}")
+        conn.commit()
+        cur.close()
+
+
+def build_derived_tables():
+    if read_value(
+        "SELECT count(*) FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    ):
+        build(list(build_steps))
+    else:
+        # Local servers such as pgserver's ship without pg_trgm, in which case searches scan clue_search instead
+        print("pg_trgm is not available, clue_search is built without trigram indexes")
+        run_statements([s for s in search_index_statements if "trgm" not in s])
+        build([step for step in build_steps if step != "search-index"])
+
+
+def start_local_database(directory):
+    """
+    Starts (or reuses) a private Postgres server keeping its data in directory and points JeopardyDatabase at it.
+    Requires the pgserver package (pip install pgserver).
+
+    Output: The server's connection URL
+    """
+    import pgserver
+
+    url = pgserver.get_server(directory, cleanup_mode=None).get_uri()
+    JeopardyDatabase.database_url = url
+    return url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load a synthetic Jeopardy archive into a database and build its derived tables."
+    )
+    parser.add_argument("shows", nargs="?", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--first-show", type=int, default=1, help="number of the first show"
+    )
+    parser.add_argument(
+        "--pgdata",
+        help="start a local Postgres server with its data in this directory instead of using database_url_jeopardy",
+    )
+    parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="allow replacing an existing games_view table",
+    )
+    args = parser.parse_args()
+
+    if args.pgdata:
+        print(f"database_url_jeopardy={start_local_database(args.pgdata)}")
+    if not args.replace and read_value("SELECT to_regclass('games_view')::text"):
+        parser.error("the database already has a games_view table, pass --replace")
+
+    tables = generate(args.shows, args.seed, args.first_show)
+    load(tables)
+    print(", ".join(f"{table}: {len(rows)} rows" for table, rows in tables.items()))
+    build_derived_tables()
@@ -2,6 +2,12 @@ import dash
 from dash import html, Dash
 import dash_bootstrap_components as dbc
 import os
+import plotly.io
+from flask_compress import Compress
+from JeopardyMetrics import instrument
+
+# Callback responses are serialized by plotly.io, orjson being several times faster than the standard json module
+plotly.io.json.config.default_engine = "orjson"
 
 app = Dash(
     __name__,
@@ -12,6 +18,12 @@ app = Dash(
     ],
 )
 server = app.server
+# Responses are compressed with brotli or gzip, whichever the browser accepts. Dash's compress option is not used
+# because its choice of algorithms is applied after flask-compress has already read them.
+server.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+server.config["COMPRESS_BR_LEVEL"] = int(os.getenv("jeopardy_compress_br_level", 5))
+Compress(server)
+instrument(server)
 #server.secret_key = os.environ.get("secret_key", "secret")
 
 
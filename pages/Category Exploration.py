@@ -5,11 +5,9 @@ from dash import dash_table, Input, Output, dcc, html, register_page
 from datetime import date
 import plotly.express as px
 import numpy as np
-from sqlalchemy import create_engine
-import os
-import psycopg2
-
-database_url = os.getenv("database_url_jeopardy")
+from JeopardyDatabase import read_sql
+from JeopardyFunctions import max_air_date
+from JeopardyMetrics import timer
 
 
 register_page(
@@ -28,13 +26,7 @@ explanation_string = """This dashboard creates a bar graph of the top 25 categor
 
 
 def serve_layout_responses():
-    conn = psycopg2.connect(database_url)
-    cur = conn.cursor()
-    query_max_date = "Select max(air_date) from games_view"
-    cur.execute(query_max_date)
-    results = cur.fetchone()[0]
-    cur.close()
-    conn.close()
+    results = max_air_date()
     return dbc.Container(
         [
             dbc.Row(
@@ -126,61 +118,53 @@ def plot_categories(search_term, search_destination, offset, start_date, end_dat
     }
     search_destination_sql = search_destination_sql_dict[search_destination]
 
-    conn = psycopg2.connect(database_url)
-    cur = conn.cursor()
     clues_columns = [f"{search_destination_sql}", "count", "percent_correct"]
+    params = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "offset": offset,
+        "search_term": f"%{search_term}%",
+    }
     if search_term != "":
-        query_clues = """
+        query_clues = f"""
             SELECT {search_destination_sql} , COUNT({search_destination_sql}) , SUM(CASE WHEN n_correct >= 1 then 1 else 0 end)::float/COUNT(correct_response) percent_correct
-            FROM clues_view
+            FROM clue_search
             
-            WHERE  {search_destination_sql}  ILIKE '%{search_term}%'  and correct_response <> '=' and air_date between '{start_date}' and '{end_date}'
+            WHERE  {search_destination_sql}  ILIKE %(search_term)s  and correct_response <> '=' and air_date between %(start_date)s and %(end_date)s
             GROUP BY {search_destination_sql}
             ORDER BY COUNT(correct_response) desc
-            LIMIT 15 OFFSET {offset}
-                       """.format(
-            search_destination_sql=search_destination_sql,
-            start_date=start_date,
-            end_date=end_date,
-            offset=offset,
-            search_term=search_term,
-        )
+            LIMIT 15 OFFSET %(offset)s
+                       """
     else:
-        query_clues = """
+        query_clues = f"""
                 SELECT {search_destination_sql}, COUNT({search_destination_sql}), SUM(CASE WHEN n_correct >= 1 then 1 else 0 end)::float/COUNT(correct_response) percent_correct
                 FROM clues_view
-                WHERE air_date between '{start_date}' and '{end_date}' and correct_response <> '='
+                WHERE air_date between %(start_date)s and %(end_date)s and correct_response <> '='
                 GROUP BY {search_destination_sql}
                 HAVING COUNT(correct_response) > 0
                 ORDER BY COUNT({search_destination_sql}) desc
-                LIMIT 15 OFFSET {offset}""".format(
-            search_destination_sql=search_destination_sql,
-            start_date=start_date,
-            end_date=end_date,
-            offset=offset,
-        )
+                LIMIT 15 OFFSET %(offset)s"""
 
-    cur.execute(query_clues)
-    results = cur.fetchall()
-    dff = pd.DataFrame(results, columns=clues_columns).sort_values(
-        "count", ascending=True
-    )
+    dff = read_sql(query_clues, params)
+    dff.columns = clues_columns
+    dff = dff.sort_values("count", ascending=True)
 
     dff["percent_correct"] = dff["percent_correct"].multiply(100).round(2)
-    fig = px.bar(
-        dff,
-        y=f"{search_destination_sql}",
-        x="count",
-        color="percent_correct",
-        color_continuous_scale="RdYlGn",
-        color_continuous_midpoint=85,
-    )
-    fig.update_layout(
-        title={
-            "text": f"{offset}-{15+offset} most frequent {search_destination}",
-            "font": {"size": 30},
-        },
-    )
+    with timer("figure", "Category Exploration.plot_categories"):
+        fig = px.bar(
+            dff,
+            y=f"{search_destination_sql}",
+            x="count",
+            color="percent_correct",
+            color_continuous_scale="RdYlGn",
+            color_continuous_midpoint=85,
+        )
+        fig.update_layout(
+            title={
+                "text": f"{offset}-{15+offset} most frequent {search_destination}",
+                "font": {"size": 30},
+            },
+        )
 
     return fig
 
@@ -227,23 +211,15 @@ def update(clickdata, search_destination, start_date, end_date):
         "Number Correct",
         "Correct Response",
     ]
-    conn = psycopg2.connect(database_url)
-    cur = conn.cursor()
 
-    query_clues = """
+    query_clues = f"""
             SELECT air_date, round_id round, clue_value, category, clue, n_correct, correct_response
-            FROM clues_view
-            WHERE {search_destination_sql} ILIKE '%{term}%' and air_date between '{start_date}' and '{end_date}' 
+            FROM clue_search
+            WHERE {search_destination_sql} ILIKE %s and air_date between %s and %s
             ORDER BY air_date desc
-            """.format(
-        search_destination_sql=search_destination_sql,
-        term=clickdata_y,
-        start_date=start_date,
-        end_date=end_date,
-    )
-    cur.execute(query_clues)
-    results = cur.fetchall()
-    dff = pd.DataFrame(results, columns=clues_columns)
+            """
+    dff = read_sql(query_clues, [f"%{clickdata_y}%", start_date, end_date])
+    dff.columns = clues_columns
 
     dff["Air Date"] = pd.DatetimeIndex(dff["Air Date"]).strftime("%Y-%m-%d")
 
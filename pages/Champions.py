@@ -1,13 +1,18 @@
 import dash
 import dash_bootstrap_components as dbc
+import numpy as np
 import pandas as pd
 from dash import dash_table, Input, Output, dcc, html, register_page, callback
 import plotly.graph_objects as go
 import plotly.express as px
-from sqlalchemy import create_engine
-import os
-
-database_url = os.getenv("database_url_jeopardy")
+from JeopardyDatabase import prepare, read_prepared
+from JeopardyMetrics import timed, timer
+from JeopardyFunctions import (
+    as_clue_dtypes,
+    champion_options,
+    game_progression_many,
+    load_champion_stats,
+)
 
 register_page(
     __name__,
@@ -37,7 +42,7 @@ def serve_layout_contestants():
                             html.P("Select Champion:"),
                             dcc.Dropdown(
                                 id="champion-select",
-                                options=[],
+                                options=champion_options(),
                                 value="Ken Jennings",
                                 clearable=False,
                             ),
@@ -54,6 +59,7 @@ def serve_layout_contestants():
                     dbc.Col([dcc.Graph(id="winnings-hist")], width=6),
                 ]
             ),
+            dbc.Row([dbc.Col([dcc.Graph(id="champion-games")])]),
             html.Hr(),
             dbc.Row(
                 [
@@ -70,70 +76,66 @@ def serve_layout_contestants():
 
 layout = serve_layout_contestants
 
-
-@callback(
-    Output(component_id="champion-select", component_property="options"),
-    Output(component_id="win-streak-hist", component_property="figure"),
-    Output(component_id="winnings-hist", component_property="figure"),
-    Output(component_id="champion-indicator", component_property="figure"),
-    Output(component_id="correct-answers", component_property="children"),
-    Output(component_id="contestant-clues", component_property="children"),
-    Input(component_id="champion-select", component_property="value"),
+# The regular season clues of every game a contestant played in
+champion_clues_statement = prepare(
+    "jeopardy_champion_clues",
+    ["text"],
+    """SELECT c.show_number, game_comments, c.air_date, round_id, value, order_number, category, clue, correct_response, correct_contestants, incorrect_contestants
+        FROM clues_typed c
+        LEFT JOIN games_view g on c.show_number = g.show_number
+        where c.show_number in (select distinct show_number from contestants where contestant = $1)
+        and regular_season = True
+        ORDER BY c.show_number, order_number""",
 )
-def get_champions(champion):
-    engine = create_engine(database_url)
-
-    champions_query = f"""
-        SELECT contestant, max(returning_champion_streak::float), max(returning_champion_winnings), max(returning_champion_winnings::float)/max(returning_champion_streak::float) avg_winnings
-        from contestants c
-        INNER JOIN games_view g on c.contestant = g.returning_champion 
-        WHERE regular_season = True AND returning_champion_winnings is not null
-        GROUP BY contestant
-        ORDER BY max(returning_champion_winnings) desc
-    """
-
-    dff = pd.read_sql_query(champions_query, con=engine)
-    dff.columns = ["contestant", "streak", "winnings", "average winnings"]
-    fig_streak = px.histogram(dff, x="streak")
-    fig_streak.add_vline(x=dff[dff["contestant"] == champion]["streak"].iloc[0])
-    fig_streak.update_layout(
-        title=f"Returning Champion Winning Streaks, {champion} Selected"  # , height=700
-    )
 
-    fig_earnings = px.histogram(dff, x="winnings")
-    fig_earnings.add_vline(x=dff[dff["contestant"] == champion]["winnings"].iloc[0])
-    fig_earnings.update_layout(
-        title=f"Returning Champion Winnings, {champion} Selected"  # , height=700
+
+@timed("figure")
+def champion_histogram(statistic, value, title):
+    counts, edges = load_champion_stats()["histograms"][statistic]
+    centers = (edges[:-1] + edges[1:]) / 2
+    if statistic == "streak":
+        # Streak bins are centered on each whole streak
+        hovertext = [f"{center:.0f}" for center in centers]
+    else:
+        hovertext = [f"{low:,.0f} - {high:,.0f}" for low, high in zip(edges, edges[1:])]
+    fig = go.Figure(
+        go.Bar(x=centers, y=counts, width=np.diff(edges), hovertext=hovertext)
     )
+    fig.update_layout(xaxis_title=statistic, yaxis_title="count", bargap=0, title=title)
+    fig.add_vline(x=value)
+    return fig
+
 
+@timed("figure")
+def champion_indicator(champion, stats, medians):
     indicator = go.Figure()
 
     indicator.add_trace(
         go.Indicator(
             mode="number+delta",
-            value=dff[dff["contestant"] == champion]["streak"].iloc[0],
+            value=stats["streak"],
             title={"text": "Win Streak"},
             domain={"x": [0, 0.33], "y": [0.5, 1]},
-            delta={"reference": dff["streak"].median()},
+            delta={"reference": medians["streak"]},
         )
     )
 
     indicator.add_trace(
         go.Indicator(
             mode="number+delta",
-            value=dff[dff["contestant"] == champion]["winnings"].iloc[0],
+            value=stats["winnings"],
             title={"text": "Winnings as Champion"},
             domain={"x": [0.33, 0.66], "y": [0.5, 1]},
-            delta={"reference": dff["winnings"].median()},
+            delta={"reference": medians["winnings"]},
         )
     )
     indicator.add_trace(
         go.Indicator(
             mode="number+delta",
-            value=dff[dff["contestant"] == champion]["average winnings"].iloc[0],
+            value=stats["average_winnings"],
             title={"text": "Average Winnings"},
             domain={"x": [0.66, 1], "y": [0.5, 1]},
-            delta={"reference": dff["average winnings"].median()},
+            delta={"reference": medians["average_winnings"]},
         )
     )
 
@@ -143,69 +145,10 @@ def get_champions(champion):
         font={"size": 16},
     )
 
-    query = f"""
-        SELECT c.show_number, game_comments, c.air_date, round_id round, value, order_number, category, clue, correct_response, correct_contestants, incorrect_contestants
-        FROM clues_view c
-        LEFT JOIN games_view g on c.show_number = g.show_number
-        where c.show_number in (select distinct show_number from contestants where contestant = '{champion}') 
-        and regular_season = True
-        ORDER BY c.show_number, order_number
-        """
-
-    query_nickname = f"""
-        SELECT distinct contestant_nickname from contestants where contestant ='{champion}'
-        """
-
-    dff_clues = pd.read_sql_query(query, con=engine)
-
-    dff_clues["order_number"] = (
-        dff_clues["order_number"].astype(str).str.replace("FJ", "61").astype(int)
-    )
-    try:
-        dff_clues["round"] = (
-            dff_clues["round"]
-            .astype("category")
-            .cat.reorder_categories(["J", "DJ", "FJ"], ordered=True)
-        )
-    except:
-        dff_clues["order_number"] = (
-            dff_clues["order_number"].astype(str).str.replace("TB", "62").astype(int)
-        )
-        dff_clues["round"] = (
-            dff_clues["round"]
-            .astype("category")
-            .cat.reorder_categories(["J", "DJ", "FJ", "TB"], ordered=True)
-        )
-
-    dff_clues["air_date"] = pd.DatetimeIndex(dff_clues["air_date"]).strftime("%Y-%m-%d")
-    dff_clues = dff_clues.sort_values(by=["show_number", "round", "order_number"])
-
-    table_clues = dash_table.DataTable(
-        data=dff_clues.to_dict("records"),
-        columns=[{"name": i, "id": i} for i in dff_clues.columns],
-        style_cell={"textAlign": "left", "height": "auto", "fontSize": 12},
-        page_size=10,
-        style_data={"whiteSpace": "normal", "height": "auto"},
-        sort_action="native",
-        filter_action="native",
-        export_format="csv",
-    )
-
-    nickname = pd.read_sql_query(query_nickname, con=engine).squeeze()
-    engine.dispose()
-
-    regular_clues = dff_clues[dff_clues["round"] != "FJ"]
-    total = len(regular_clues)
-    n_correct = regular_clues["correct_contestants"].str.contains(nickname).sum()
-    n_incorrect = regular_clues["incorrect_contestants"].str.contains(nickname).sum()
-
-    fj = dff_clues[dff_clues["round"] == "FJ"]
-    n_fj_correct = fj["correct_contestants"].str.contains(nickname).sum()
-
     indicator.add_trace(
         go.Indicator(
             mode="number",
-            value=100 * n_correct / total,
+            value=stats["percent_correct"],
             number={"suffix": "%"},
             title={"text": "Percent of All Regular Clues Answered Correctly"},
             domain={"x": [0, 0.33], "y": [0, 0.5]},
@@ -215,7 +158,7 @@ def get_champions(champion):
     indicator.add_trace(
         go.Indicator(
             mode="number",
-            value=100 * n_correct / (n_correct + n_incorrect),
+            value=stats["response_accuracy"],
             number={"suffix": "%"},
             title={"text": "Percent of Responses Being Correct"},
             domain={"x": [0.33, 0.66], "y": [0, 0.5]},
@@ -224,18 +167,77 @@ def get_champions(champion):
     indicator.add_trace(
         go.Indicator(
             mode="number",
-            value=100 * n_fj_correct / len(fj),
+            value=stats["fj_accuracy"],
             number={"suffix": "%"},
             title={"text": "Percent of Final Jeopardy Clues Answered Correctly"},
             domain={"x": [0.66, 1], "y": [0, 0.5]},
         )
     )
+    return indicator
+
+
+@callback(
+    Output(component_id="win-streak-hist", component_property="figure"),
+    Output(component_id="winnings-hist", component_property="figure"),
+    Output(component_id="champion-indicator", component_property="figure"),
+    Output(component_id="champion-games", component_property="figure"),
+    Output(component_id="correct-answers", component_property="children"),
+    Output(component_id="contestant-clues", component_property="children"),
+    Input(component_id="champion-select", component_property="value"),
+)
+def get_champions(champion):
+    champion_stats = load_champion_stats()
+    stats = champion_stats["table"].loc[champion]
+    medians = champion_stats["medians"]
+
+    fig_streak = champion_histogram(
+        "streak",
+        stats["streak"],
+        f"Returning Champion Winning Streaks, {champion} Selected",  # , height=700
+    )
+    fig_earnings = champion_histogram(
+        "winnings",
+        stats["winnings"],
+        f"Returning Champion Winnings, {champion} Selected",  # , height=700
+    )
+
+    indicator = champion_indicator(champion, stats, medians)
+
+    dff_clues = as_clue_dtypes(
+        read_prepared(champion_clues_statement, [champion])
+    ).rename(columns={"round_id": "round"})
+
+    progression = game_progression_many(dff_clues["show_number"].unique())
+    progression = progression[progression["contestant"] == champion]
+    with timer("figure", "Champions.get_champions"):
+        fig_games = px.line(
+            progression.astype({"show_number": str}),
+            x="question_number",
+            y="score",
+            color="show_number",
+            labels={"question_number": "Clue Number", "show_number": "Show"},
+        )
+        fig_games.update_layout(title=f"{champion}'s Score over Time in Every Game")
+
+    dff_clues["air_date"] = pd.DatetimeIndex(dff_clues["air_date"]).strftime("%Y-%m-%d")
+    dff_clues = dff_clues.sort_values(by=["show_number", "round", "order_number"])
+
+    table_clues = dash_table.DataTable(
+        data=dff_clues.to_dict("records"),
+        columns=[{"name": i, "id": i} for i in dff_clues.columns],
+        style_cell={"textAlign": "left", "height": "auto", "fontSize": 12},
+        page_size=10,
+        style_data={"whiteSpace": "normal", "height": "auto"},
+        sort_action="native",
+        filter_action="native",
+        export_format="csv",
+    )
 
     return (
-        dff["contestant"].squeeze(),
         fig_streak,
         fig_earnings,
         indicator,
+        fig_games,
         table_clues,
         f"Clues from {champion}'s games ",
     )
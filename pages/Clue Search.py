@@ -1,12 +1,25 @@
 import dash_bootstrap_components as dbc
-from dash import Dash, dash_table, Input, Output, dcc, html, register_page, callback
+from dash import (
+    Dash,
+    dash_table,
+    Input,
+    Output,
+    State,
+    ctx,
+    dcc,
+    html,
+    register_page,
+    callback,
+)
+import math
 import pandas as pd
-import numpy as np
-from JeopardyFunctions import find_data
-import plotly.express as px
-import os
-
-database_url = os.getenv("database_url_jeopardy")
+from JeopardyFunctions import (
+    clue_search_columns,
+    find_data,
+    find_data_page,
+    find_data_summary,
+    summary_rows,
+)
 
 
 register_page(
@@ -61,12 +74,56 @@ layout = dbc.Container(
             width=2,
         ),
         html.Hr(),
+        dbc.Row(
+            [
+                html.H2("Clues and Correct Responses"),
+                html.P(id="clue-count"),
+                dbc.Col(
+                    [
+                        dbc.Button(
+                            "Export CSV", id="clue-export", color="secondary", size="sm"
+                        ),
+                        dcc.Download(id="clue-download"),
+                    ],
+                    width=12,
+                ),
+                dbc.Col(
+                    dash_table.DataTable(
+                        id="clue-table",
+                        columns=[
+                            {"name": i, "id": i, "hideable": True}
+                            for i in clue_search_columns
+                        ],
+                        style_cell={"textAlign": "left", "height": "auto"},
+                        page_current=0,
+                        page_size=12,
+                        page_action="custom",
+                        style_data={"whiteSpace": "normal", "height": "auto"},
+                        sort_action="custom",
+                        sort_mode="multi",
+                        sort_by=[],
+                        filter_action="custom",
+                        filter_query="",
+                    ),
+                    width=10,
+                ),
+                html.Hr(),
+            ],
+            id="clue-results",
+            style={"display": "none"},
+        ),
         dbc.Row(id="output-content"),
     ],
     fluid=True,
 )
 
 
+def summary_table(summary):
+    summary = summary.groupby("group")[["Count", "Answered Correct"]].sum()
+    summary["Answered Correct %"] = summary["Answered Correct"] / summary["Count"]
+    return summary.sort_values(by="Count", ascending=False).reset_index().round(2)
+
+
 @callback(
     Output(component_id="output-content", component_property="children"),
     Input("clue-input", "value"),
@@ -76,155 +133,149 @@ layout = dbc.Container(
 def filter_clues(clue_input, search, search_type):
     if clue_input is None or len(clue_input) <= 2:
         return None
-    else:
-        dff = find_data(search, clue_input, search_type)
-        dff["Correct Response"] = dff["Correct Response"].str.title()
-        if dff.empty:
-            return None
-        else:
-            dff["Air Date"] = pd.DatetimeIndex(dff["Air Date"]).strftime("%Y-%m-%d")
-            data_to_show = dff[
-                [
-                    "Air Date",
-                    "Round",
-                    "Clue Value",
-                    "Category",
-                    "Clue",
-                    "Number Correct",
-                    "Correct Response",
-                ]
-            ]
-
-            correct_responses = dff[
+
+    correct_responses, categories = find_data_summary(search, clue_input, search_type)
+    if correct_responses.empty:
+        return None
+
+    correct_responses["group"] = correct_responses["group"].str.title()
+    pivot_table_correct_responses = summary_table(correct_responses).rename(
+        columns={"group": "Correct Response"}
+    )
+
+    dash_table_correct_responses = dash_table.DataTable(
+        data=pivot_table_correct_responses.to_dict("records"),
+        columns=[{"name": i, "id": i} for i in pivot_table_correct_responses.columns],
+        page_size=10,
+        style_data={"whiteSpace": "normal", "height": "auto"},
+        style_cell={"textAlign": "left", "height": "auto"},
+        sort_action="native",
+        filter_action="native",
+    )
+
+    pivot_table_categories = summary_table(categories).rename(
+        columns={"group": "Category"}
+    )
+
+    dash_table_categories = dash_table.DataTable(
+        data=pivot_table_categories.to_dict("records"),
+        columns=[{"name": i, "id": i} for i in pivot_table_categories.columns],
+        page_size=10,
+        style_data={"whiteSpace": "normal", "height": "auto"},
+        style_cell={"textAlign": "left", "height": "auto"},
+        sort_action="native",
+        filter_action="native",
+    )
+
+    return dbc.Row(
+        [
+            dbc.Col(
                 [
-                    "Air Date",
-                    "Round",
-                    "Clue Value",
-                    "Category",
-                    "Correct Response",
-                    "Number Correct",
-                ]
-            ]
-            correct_responses.columns = [
-                "Air Date",
-                "Round",
-                "Clue Value",
-                "Category",
-                "Clue",
-                "Number Correct",
-            ]
-
-            table = dash_table.DataTable(
-                data=data_to_show.to_dict("records"),
-                columns=[
-                    {"name": i, "id": i, "hideable": True} for i in data_to_show.columns
-                ],
-                style_cell={"textAlign": "left", "height": "auto"},
-                tooltip_data=[
-                    {
-                        column: {"value": str(value), "type": "markdown"}
-                        for column, value in row.items()
-                    }
-                    for row in correct_responses.to_dict("records")
+                    html.H2("Correct Response Summary"),
+                    html.P(f"The {summary_rows} most frequent correct responses"),
+                    dash_table_correct_responses,
                 ],
-                page_size=12,
-                style_data={"whiteSpace": "normal", "height": "auto"},
-                sort_action="native",
-                filter_action="native",
-                export_format="csv",
-            )
-            correct_responses.columns = [
-                "Air Date",
-                "Round",
-                "Clue Value",
-                "Category",
-                "Correct Response",
-                "Number Correct",
-            ]
-
-            pivot_table_correct_responses = correct_responses[
-                correct_responses["Round"] != "FJ"
-            ].pivot_table(
-                index="Correct Response",
-                values=["Number Correct"],
-                aggfunc={"Number Correct": [np.size, np.sum]},
-            )
-            pivot_table_correct_responses.columns = [
-                " ".join(col) for col in pivot_table_correct_responses.columns.values
-            ]
-            pivot_table_correct_responses.columns = ["Count", "Answered Correct"]
-            pivot_table_correct_responses["Answered Correct %"] = (
-                pivot_table_correct_responses["Answered Correct"]
-                / pivot_table_correct_responses["Count"]
-            )
-            pivot_table_correct_responses = (
-                pivot_table_correct_responses.sort_values(by="Count", ascending=False)
-                .reset_index()
-                .round(2)
-            )
-
-            dash_table_correct_responses = dash_table.DataTable(
-                data=pivot_table_correct_responses.to_dict("records"),
-                columns=[
-                    {"name": i, "id": i} for i in pivot_table_correct_responses.columns
-                ],
-                page_size=10,
-                style_data={"whiteSpace": "normal", "height": "auto"},
-                style_cell={"textAlign": "left", "height": "auto"},
-                sort_action="native",
-                filter_action="native",
-            )
-
-            pivot_table_categories = correct_responses[
-                correct_responses["Round"] != "FJ"
-            ].pivot_table(
-                index="Category",
-                values=["Number Correct"],
-                aggfunc={"Number Correct": [np.size, np.sum]},
-            )
-            pivot_table_categories.columns = [
-                " ".join(col) for col in pivot_table_categories.columns.values
-            ]
-            pivot_table_categories.columns = ["Count", "Answered Correct"]
-            pivot_table_categories["Answered Correct %"] = (
-                pivot_table_categories["Answered Correct"]
-                / pivot_table_categories["Count"]
-            )
-            pivot_table_categories = (
-                pivot_table_categories.sort_values(by="Count", ascending=False)
-                .reset_index()
-                .round(2)
-            )
-
-            dash_table_categories = dash_table.DataTable(
-                data=pivot_table_categories.to_dict("records"),
-                columns=[{"name": i, "id": i} for i in pivot_table_categories.columns],
-                page_size=10,
-                style_data={"whiteSpace": "normal", "height": "auto"},
-                style_cell={"textAlign": "left", "height": "auto"},
-                sort_action="native",
-                filter_action="native",
-            )
-
-            return dbc.Row(
+                width=6,
+            ),
+            dbc.Col(
                 [
-                    html.H2("Clues and Correct Responses"),
-                    dbc.Col(table, width=10),
-                    html.Hr(),
-                    dbc.Row(
-                        [
-                            dbc.Col(
-                                [
-                                    html.H2("Correct Response Summary"),
-                                    dash_table_correct_responses,
-                                ],
-                                width=6,
-                            ),
-                            dbc.Col(
-                                [html.H2("Category Summary"), dash_table_categories],
-                                width=6,
-                            ),
-                        ]
-                    ),
-                ]
-            )
+                    html.H2("Category Summary"),
+                    html.P(f"The {summary_rows} most frequent categories"),
+                    dash_table_categories,
+                ],
+                width=6,
+            ),
+        ]
+    )
+
+
+def format_clues(dff):
+    dff["Correct Response"] = dff["Correct Response"].str.title()
+    dff["Air Date"] = pd.DatetimeIndex(dff["Air Date"]).strftime("%Y-%m-%d")
+    return dff
+
+
+@callback(
+    Output(component_id="clue-table", component_property="data"),
+    Output(component_id="clue-table", component_property="tooltip_data"),
+    Output(component_id="clue-table", component_property="page_count"),
+    Output(component_id="clue-count", component_property="children"),
+    Output(component_id="clue-results", component_property="style"),
+    Output(component_id="clue-table", component_property="page_current"),
+    Input("clue-input", "value"),
+    Input("search", "value"),
+    Input("search-type", "value"),
+    Input("clue-table", "page_current"),
+    Input("clue-table", "page_size"),
+    Input("clue-table", "sort_by"),
+    Input("clue-table", "filter_query"),
+)
+def page_clues(
+    clue_input, search, search_type, page_current, page_size, sort_by, filter_query
+):
+    # A new search, sort or filter starts again from the first page
+    if "clue-table.page_current" not in ctx.triggered_prop_ids:
+        page_current = 0
+    return clue_page(
+        clue_input, search, search_type, page_current, page_size, sort_by, filter_query
+    )
+
+
+def clue_page(
+    clue_input, search, search_type, page_current, page_size, sort_by, filter_query
+):
+    if clue_input is None or len(clue_input) <= 2:
+        return [], [], 1, None, {"display": "none"}, 0
+
+    dff, total = find_data_page(
+        search,
+        clue_input,
+        search_type,
+        page_current or 0,
+        page_size,
+        sort_by,
+        filter_query,
+    )
+    if total == 0 and not filter_query:
+        return [], [], 1, None, {"display": "none"}, 0
+
+    dff = format_clues(dff)
+
+    # Hovering over a clue shows its correct response
+    correct_responses = dff.drop(columns=["Clue"]).rename(
+        columns={"Correct Response": "Clue"}
+    )
+    tooltip_data = [
+        {
+            column: {"value": str(value), "type": "markdown"}
+            for column, value in row.items()
+        }
+        for row in correct_responses.to_dict("records")
+    ]
+
+    return (
+        dff.to_dict("records"),
+        tooltip_data,
+        max(math.ceil(total / page_size), 1),
+        f"{total:,} clues found",
+        {},
+        page_current or 0,
+    )
+
+
+@callback(
+    Output(component_id="clue-download", component_property="data"),
+    Input("clue-export", "n_clicks"),
+    State("clue-input", "value"),
+    State("search", "value"),
+    State("search-type", "value"),
+    State("clue-table", "sort_by"),
+    State("clue-table", "filter_query"),
+    prevent_initial_call=True,
+)
+def export_clues(n_clicks, clue_input, search, search_type, sort_by, filter_query):
+    # Every clue matching the search, sort and filter, not only the page on screen
+    dff = format_clues(
+        find_data(search, clue_input, search_type, sort_by, filter_query)
+    )
+    return dcc.send_data_frame(dff.to_csv, "clues.csv", index=False)
@@ -1,13 +1,18 @@
 import dash_bootstrap_components as dbc
 import pandas as pd
-from dash import dash_table, Input, Output, dcc, html, register_page, callback
-from JeopardyFunctions import pivot_game, game_progression
+from dash import dash_table, Input, Output, State, dcc, html, register_page, callback
+from dash.exceptions import PreventUpdate
+from JeopardyFunctions import (
+    pivot_game,
+    game_progression,
+    load_show_index,
+    search_shows,
+    show_option,
+)
 import plotly.express as px
-from sqlalchemy import create_engine
-import os
+from JeopardyMetrics import timer
 
 font_size = 14
-database_url = os.getenv("database_url_jeopardy")
 
 
 register_page(
@@ -25,11 +30,9 @@ The dashboard also shows the final scores for each contestant and the number of
 
 
 def serve_layout_games():
-    engine = create_engine(database_url)
-    shows_query = f"""SELECT CONCAT('Show Number #', show_number, ' - ', to_char(air_date, 'Day,  Month DD, YYYY')) FROM games_view ORDER BY show_number """
-    shows = pd.read_sql(shows_query, con=engine).squeeze()
+    # Only the latest show is sent with the page; other shows are found by searching
+    latest_show = show_option(load_show_index(), -1)
 
-    engine.dispose()
     return dbc.Container(
         [
             html.H1("Game Summary Dashboard"),
@@ -39,8 +42,9 @@ def serve_layout_games():
                     [
                         dcc.Dropdown(
                             id="show-number",
-                            options=shows,
-                            value=shows.iloc[-1],
+                            options=[latest_show],
+                            value=latest_show["value"],
+                            placeholder="Search by show number, air date or contestant",
                             clearable=False,
                         )
                     ],
@@ -58,13 +62,24 @@ def serve_layout_games():
 layout = serve_layout_games
 
 
+@callback(
+    Output(component_id="show-number", component_property="options"),
+    Input(component_id="show-number", component_property="search_value"),
+    State(component_id="show-number", component_property="value"),
+)
+def search_show_options(search_value, show_number):
+    if not search_value:
+        raise PreventUpdate
+    return search_shows(load_show_index(), search_value, selected=show_number)
+
+
 @callback(
     Output(component_id="output-content2", component_property="children"),
     Input(component_id="show-number", component_property="value"),
 )
 def get_data(show_number):
-    show_number = int(show_number.split("#")[1].split(" -")[0])
-
+    if show_number is None:
+        raise PreventUpdate
     (
         j_clues,
         j_correct_responses,
@@ -80,22 +95,23 @@ def get_data(show_number):
     final_scores = scores.iloc[:, 1:4]
     dds = scores.iloc[:, 4]
     dds_indexes = dds[dds == 1].index
-    fig = px.line(final_scores)  # , height=800
-    fig.update_layout(hovermode="x unified")
-    fig.update_traces(mode="lines", hovertemplate=None)
-
-    for i in range(len(dds_indexes)):
-        fig.add_vline(x=dds_indexes[i], line_color="deeppink", line_dash="dash")
-
-    fig.update_layout(
-        title=dict(
-            text="Contestant Scores over Time <br><sup>Dashed pink lines indicate locations of the Daily Double</sup>",
-            font=dict(size=22),
-        ),
-        xaxis_title="Clue Number",
-        yaxis_title="Contestant Score",
-        legend_title_text="Contestant",
-    )
+    with timer("figure", "Games.get_data"):
+        fig = px.line(final_scores)  # , height=800
+        fig.update_layout(hovermode="x unified")
+        fig.update_traces(mode="lines", hovertemplate=None)
+
+        for i in range(len(dds_indexes)):
+            fig.add_vline(x=dds_indexes[i], line_color="deeppink", line_dash="dash")
+
+        fig.update_layout(
+            title=dict(
+                text="Contestant Scores over Time <br><sup>Dashed pink lines indicate locations of the Daily Double</sup>",
+                font=dict(size=22),
+            ),
+            xaxis_title="Clue Number",
+            yaxis_title="Contestant Score",
+            legend_title_text="Contestant",
+        )
 
     j_round_table = dash_table.DataTable(
         data=j_clues.to_dict("records"),
@@ -1,15 +1,14 @@
 import dash
 import dash_bootstrap_components as dbc
-import pandas as pd
 from dash import Input, Output, dcc, html, register_page
 import plotly.express as px
 from datetime import date
-from sqlalchemy import create_engine
-import os
-import psycopg2
+from JeopardyCache import cached_figures
+from JeopardyDatabase import read_sql_parallel
+from JeopardyFunctions import board_statistics, max_air_date
+from JeopardyMetrics import timed
 col_width = 9
 font_size = 16
-database_url = os.getenv("database_url_jeopardy")
 
 register_page(
     __name__,
@@ -26,13 +25,7 @@ explanation_string = (
 
 
 def serve_layout_visualizations():
-    conn = psycopg2.connect(database_url)
-    cur = conn.cursor()
-    query_max_date = "Select max(air_date) from games_view"
-    cur.execute(query_max_date)
-    max_date = cur.fetchone()[0].date()
-    cur.close()
-    conn.close()
+    max_date = max_air_date().date()
 
     return dbc.Container(
         [
@@ -127,170 +120,117 @@ def serve_layout_visualizations():
 layout = serve_layout_visualizations
 
 
-@dash.callback(
-    Output(component_id="answer-correct-graph", component_property="figure"),
-    Output(component_id="daily-double-graph", component_property="figure"),
-    Output(component_id="expected-value-graph", component_property="figure"),
-    Output(component_id="fj-graph", component_property="figure"),
-    Input(component_id="air-date-range", component_property="start_date"),
-    Input(component_id="air-date-range", component_property="end_date"),
-)
-def plot_prob_correct(start_date, end_date):
-    engine = create_engine(database_url)
-
-    max_air_date_query = f"""SELECT MAX(air_date) FROM clues_view """
-    max_air_date_string = (
-        pd.read_sql(max_air_date_query, con=engine)
-        .squeeze()
-        .date()
-        .strftime("%Y-%m-%d")
-    )
+def query_board_statistics(start_date, end_date):
+    """
+    Runs the four board queries side by side on the shared query threads and yields (statistic, result) pairs
+    as each query finishes.
+    """
+    clues_query = """
+    SELECT round_id, c.category_column, row_id,  SUM(n_correct)::float/COUNT(n_correct) percent_correct
+    FROM clues_view c
+    WHERE round_id in ('DJ', 'J') and c.air_date between %(start_date)s and %(end_date)s
+    GROUP BY round_id, c.category_column, row_id
+    ORDER BY round_id desc, row_id, c.category_column
+    """
 
-    if start_date == "2001-11-26" and end_date == max_air_date_string:
-        clues_query = f"""
-                        SELECT * FROM clue_prob_correct
-                        """
-    else:
-        clues_query = f"""
-        SELECT round_id, c.category_column, row_id,  SUM(n_correct)::float/COUNT(n_correct) percent_correct
-        FROM clues_view c
-        WHERE round_id in ('DJ', 'J') and c.air_date between '{start_date}' and '{end_date}'
-        GROUP BY round_id, c.category_column, row_id
-        ORDER BY round_id desc, row_id, c.category_column
-        """
+    query_dd = """
 
-    clues_df = pd.read_sql_query(clues_query, con=engine)
+    with subq as (SELECT round_id, c.category_column, row_id, CASE WHEN LEFT(value,2) = 'DD' then 1 else 0 end is_dd
+    FROM clues_view c
+    WHERE round_id in ('DJ', 'J')  and c.air_date between %(start_date)s and %(end_date)s
 
-    columns = [f"Column {i}" for i in range(1, 7)]
-    rows = [f"Row {i}" for i in range(1, 6)]
+    ORDER BY round_id desc, c.category_column, row_id)
 
-    data_prob =  clues_df["percent_correct"].multiply(100).round(4).to_numpy().reshape(2, 5, 6)
-    fig_prob = px.imshow(
-        data_prob,
-        facet_col=0,
-        facet_col_wrap=2,
-        color_continuous_scale="blues",
-        height=550,
-        text_auto=True,
-        #labels=dict(y="Row", color="Percent Answered Correctly"),
-        x=columns,
-        y=rows,
-    )
+    SELECT round_id, subq.category_column, row_id,  SUM(is_dd)::float/(SELECT SUM(is_dd) from subq where round_id = 'J' group by round_id)
+    from subq
+    WHERE round_id = 'J' 
+    group by round_id, subq.category_column, row_id
+    UNION 
+    SELECT round_id, subq.category_column, row_id,  SUM(is_dd)::float/(SELECT SUM(is_dd) from subq where round_id = 'DJ' group by round_id)
+    from subq
+    WHERE round_id = 'DJ'
+    group by round_id, subq.category_column, row_id
+    ORDER BY round_id desc, row_id
+    """
 
-    fig_prob.layout.annotations[0]["text"] = "Jeopardy Round"
-    fig_prob.layout.annotations[1]["text"] = "Double Jeopardy Round"
-    fig_prob.update_layout(
-        title={
-            "text": "Probability of Clue being Answered Correctly",
-            "font": {"size": 30},
-            "xanchor": "center",
-            "yanchor": "top",
-            "x": 0.5,
-            "y": 0.98,
-        },
-        font={"size": 14},
-        margin={"t": 75},
-    )
-    fig_prob.update_xaxes(visible=False)
-    fig_prob.update_yaxes(visible=False)
-    if start_date == "2001-11-26" and end_date == max_air_date_string:
-        query_dd = f"""
-                    SELECT * FROM daily_double_locations
-                    """
-    else:
-        print(start_date, end_date)
-        query_dd = f"""
-    
-        with subq as (SELECT round_id, c.category_column, row_id, CASE WHEN LEFT(value,2) = 'DD' then 1 else 0 end is_dd
+    query_ev = """
+        SELECT c.round_id, c.category_column, c.row_id, AVG((c.n_correct * clue_value::float - c.n_incorrect * clue_value::float)) earnings
         FROM clues_view c
-        WHERE round_id in ('DJ', 'J')  and c.air_date between '{start_date}' and '{end_date}'
-    
-        ORDER BY round_id desc, c.category_column, row_id)
-    
-        SELECT round_id, subq.category_column, row_id,  SUM(is_dd)::float/(SELECT SUM(is_dd) from subq where round_id = 'J' group by round_id)
-        from subq
-        WHERE round_id = 'J' 
-        group by round_id, subq.category_column, row_id
-        UNION 
-        SELECT round_id, subq.category_column, row_id,  SUM(is_dd)::float/(SELECT SUM(is_dd) from subq where round_id = 'DJ' group by round_id)
-        from subq
-        WHERE round_id = 'DJ'
-        group by round_id, subq.category_column, row_id
-        ORDER BY round_id desc, row_id
+        WHERE round_id in ('J', 'DJ') and c.air_date between %(start_date)s and %(end_date)s and is_dd = false
+        GROUP BY c.round_id, c.row_id, c.category_column
+        ORDER BY round_id desc, row_id, c.category_column
+    """
+
+    query_fj = """
+    SELECT n_correct, COUNT(n_correct), 100 * COUNT(n_correct)::float/(SELECT COUNT(DISTINCT c.show_number) from games_view g LEFT JOIN clues_view c on c.show_number = g.show_number where regular_season = True and c.air_date between %(start_date)s and %(end_date)s)
+        FROM clues_view c left join games_view g on g.show_number = c.show_number where round_id = 'FJ' and regular_season = True and c.air_date between %(start_date)s and %(end_date)s
+        GROUP BY n_correct
         """
 
-    df = pd.read_sql_query(query_dd, con=engine)
-    df.columns = ["round", "column", "row", "prob_dd"]
+    params = {"start_date": start_date, "end_date": end_date}
+    queries = {
+        "percent_correct": (clues_query, params),
+        "percent_dd": (query_dd, params),
+        "expected_value": (query_ev, params),
+        "fj_results": (query_fj, params),
+    }
+    for statistic, df, seconds in read_sql_parallel(queries):
+        if statistic == "percent_correct":
+            yield statistic, df["percent_correct"].multiply(100).to_numpy().reshape(
+                2, 5, 6
+            )
 
-    df = df.sort_values(by=["round", "row", "column"], ascending=[False, True, True])
+        elif statistic == "percent_dd":
+            df.columns = ["round", "column", "row", "prob_dd"]
+            df = df.sort_values(
+                by=["round", "row", "column"], ascending=[False, True, True]
+            )
+            yield statistic, df["prob_dd"].multiply(100).to_numpy().reshape(2, 5, 6)
 
-    data_dd = df["prob_dd"].multiply(100).round(2).to_numpy().reshape(2, 5, 6)
-    fig_dd = px.imshow(
-        data_dd,
-        facet_col=0,
-        facet_col_wrap=2,
-        color_continuous_scale="blues",
-        text_auto=True,
-        height=550,
-        #labels=dict(y="Row", color="Daily Double Probability"),
-        x=columns,
-        y=rows,
-    )
-    fig_dd.update_xaxes(side="top")
+        elif statistic == "expected_value":
+            df.columns = ["round", "column", "row", "Expected Value"]
+            yield statistic, df["Expected Value"].to_numpy().reshape(2, 5, 6)
 
-    fig_dd.layout.annotations[0]["text"] = "Jeopardy Round"
-    fig_dd.layout.annotations[1]["text"] = "Double Jeopardy Round"
-    fig_dd.update_layout(
-        title={
-            "text": "Daily Double Location Probability",
-            "font": {"size": 30},
-            "xanchor": "center",
-            "yanchor": "top",
-            "x": 0.5,
-            "y": 0.98,
-        },
-        font={"size": 14},
-        margin={"t": 75},
-    )
-    fig_dd.update_xaxes(visible=False)
-    fig_dd.update_yaxes(visible=False)
-    print(fig_dd)
-    if start_date == "2001-11-26" and end_date == max_air_date_string:
-        query_ev = f"""
-        SELECT * FROM clue_ev
-        """
-    else:
-        query_ev = f"""
-            SELECT c.round_id, c.category_column, c.row_id, AVG((c.n_correct * clue_value::float - c.n_incorrect * clue_value::float)) earnings
-            FROM clues_view c
-            WHERE round_id in ('J', 'DJ') and c.air_date between '{start_date}' and '{end_date}' and is_dd = false
-            GROUP BY c.round_id, c.row_id, c.category_column
-            ORDER BY round_id desc, row_id, c.category_column
-        """
+        else:
+            df.columns = [
+                "Number of Correct Contestants",
+                "Number of Clues",
+                "Percent of Clues",
+            ]
+            yield statistic, df
+
+
+board_titles = {
+    "percent_correct": "Probability of Clue being Answered Correctly",
+    "percent_dd": "Daily Double Location Probability",
+    "expected_value": "Clue Location Expected Value",
+}
+board_decimals = {"percent_correct": 4, "percent_dd": 2, "expected_value": 4}
 
-    dff_ev = pd.read_sql_query(query_ev, con=engine)
-    dff_ev.columns = ["round", "column", "row", "Expected Value"]
 
-    data_ev = dff_ev["Expected Value"].multiply(1).round(4).to_numpy().reshape(2, 5, 6)
+@timed("figure")
+def plot_board(statistic, data):
+    columns = [f"Column {i}" for i in range(1, 7)]
+    rows = [f"Row {i}" for i in range(1, 6)]
 
-    fig_ev = px.imshow(
-        data_ev,
+    fig = px.imshow(
+        data.round(board_decimals[statistic]),
         facet_col=0,
         facet_col_wrap=2,
         color_continuous_scale="blues",
         text_auto=True,
         height=550,
-        #labels=dict(y="Row", color="Clue Location Expected Value"),
         x=columns,
         y=rows,
     )
-    fig_ev.update_xaxes(side="top")
+    if statistic != "percent_correct":
+        fig.update_xaxes(side="top")
 
-    fig_ev.layout.annotations[0]["text"] = "Jeopardy Round"
-    fig_ev.layout.annotations[1]["text"] = "Double Jeopardy Round"
-    fig_ev.update_layout(
+    fig.layout.annotations[0]["text"] = "Jeopardy Round"
+    fig.layout.annotations[1]["text"] = "Double Jeopardy Round"
+    fig.update_layout(
         title={
-            "text": "Clue Location Expected Value",
+            "text": board_titles[statistic],
             "font": {"size": 30},
             "xanchor": "center",
             "yanchor": "top",
@@ -300,26 +240,13 @@ def plot_prob_correct(start_date, end_date):
         font={"size": 14},
         margin={"t": 75},
     )
-    fig_ev.update_xaxes(visible=False)
-    fig_ev.update_yaxes(visible=False)
+    fig.update_xaxes(visible=False)
+    fig.update_yaxes(visible=False)
+    return fig
 
-    if start_date == "2001-11-26" and end_date == max_air_date_string:
-        query_fj = f""" SELECT * FROM final_jeopardy_correct
-    """
-    else:
-        query_fj = f"""
-    SELECT n_correct, COUNT(n_correct), 100 * COUNT(n_correct)::float/(SELECT COUNT(DISTINCT c.show_number) from games_view g LEFT JOIN clues_view c on c.show_number = g.show_number where regular_season = True and c.air_date between '{start_date}' and '{end_date}')
-        FROM clues_view c left join games_view g on g.show_number = c.show_number where round_id = 'FJ' and regular_season = True and c.air_date between '{start_date}' and '{end_date}'
-        GROUP BY n_correct
-        """
 
-    dff_fj = pd.read_sql_query(query_fj, con=engine)
-
-    dff_fj.columns = [
-        "Number of Correct Contestants",
-        "Number of Clues",
-        "Percent of Clues",
-    ]
+@timed("figure")
+def plot_fj(dff_fj):
     dff_fj["Number of Correct Contestants"] = dff_fj[
         "Number of Correct Contestants"
     ].astype("category")
@@ -342,5 +269,40 @@ def plot_prob_correct(start_date, end_date):
         font={"size": 14},
         margin={"t": 75},
     )
-    engine.dispose()
-    return fig_prob, fig_dd, fig_ev, fig_fj
+    return fig_fj
+
+
+@dash.callback(
+    Output(component_id="answer-correct-graph", component_property="figure"),
+    Output(component_id="daily-double-graph", component_property="figure"),
+    Output(component_id="expected-value-graph", component_property="figure"),
+    Output(component_id="fj-graph", component_property="figure"),
+    Input(component_id="air-date-range", component_property="start_date"),
+    Input(component_id="air-date-range", component_property="end_date"),
+)
+@cached_figures
+def plot_prob_correct(start_date, end_date):
+    # The board cube answers any range up to the date it was last built; newer episodes are aggregated live,
+    # with each figure built as soon as its query returns rather than after all four have finished
+    statistics = board_statistics(start_date, end_date)
+    if statistics is None:
+        statistics = query_board_statistics(start_date, end_date)
+    else:
+        statistics = zip(
+            ["percent_correct", "percent_dd", "expected_value", "fj_results"],
+            statistics,
+        )
+
+    figures = {}
+    for statistic, data in statistics:
+        if statistic == "fj_results":
+            figures[statistic] = plot_fj(data)
+        else:
+            figures[statistic] = plot_board(statistic, data)
+
+    return (
+        figures["percent_correct"],
+        figures["percent_dd"],
+        figures["expected_value"],
+        figures["fj_results"],
+    )
@@ -1,13 +1,18 @@
 import dash_bootstrap_components as dbc
 import pandas as pd
-from dash import dash_table, Input, Output, dcc, html, register_page, callback
-from JeopardyFunctions import final_model_plot_data
-from sqlalchemy import create_engine
-import os
+from dash import dash_table, Input, Output, State, dcc, html, register_page, callback
+from dash.exceptions import PreventUpdate
+from JeopardyCache import cached_figures
+from JeopardyFunctions import (
+    final_model_plot_data,
+    load_show_index,
+    search_shows,
+    show_option,
+)
+from JeopardyMetrics import timer
 import plotly.express as px
 
 font_size = 14
-database_url = os.getenv("database_url_jeopardy")
 
 register_page(
     __name__,
@@ -24,11 +29,7 @@ explanation_string = (
 
 
 def serve_layout_win_probability():
-    engine = create_engine(database_url)
-    shows_query = f"""SELECT CONCAT('Show Number #', show_number, ' - ', to_char(air_date, 'Day,  Month DD, YYYY')) FROM games_view where regular_season = true and show_number >= 3966 and winning_contestant <> 'Tied'
-    ORDER BY show_number """
-    shows = pd.read_sql(shows_query, con=engine).squeeze()
-    engine.dispose()
+    latest_show = show_option(load_show_index("win_probability"), -1)
 
     return dbc.Container(
         [
@@ -39,9 +40,10 @@ def serve_layout_win_probability():
                     [
                         html.P("Select Episode:"),
                         dcc.Dropdown(
-                            id="show-number",
-                            options=shows,
-                            value=shows.iloc[-1],
+                            id="win-probability-show",
+                            options=[latest_show],
+                            value=latest_show["value"],
+                            placeholder="Search by show number, air date or contestant",
                             clearable=False,
                         ),
                     ],
@@ -61,12 +63,27 @@ def serve_layout_win_probability():
 layout = serve_layout_win_probability
 
 
+@callback(
+    Output(component_id="win-probability-show", component_property="options"),
+    Input(component_id="win-probability-show", component_property="search_value"),
+    State(component_id="win-probability-show", component_property="value"),
+)
+def search_show_options(search_value, show_number):
+    if not search_value:
+        raise PreventUpdate
+    return search_shows(
+        load_show_index("win_probability"), search_value, selected=show_number
+    )
+
+
 @callback(
     Output(component_id="win-probability-graph", component_property="figure"),
-    Input(component_id="show-number", component_property="value"),
+    Input(component_id="win-probability-show", component_property="value"),
 )
+@cached_figures
 def get_data(show_number):
-    show_number = int(show_number.split("#")[1].split(" -")[0])
+    if show_number is None:
+        raise PreventUpdate
     dff = final_model_plot_data(show_number)
 
     scores_melt = dff.melt(
@@ -98,23 +115,26 @@ def get_data(show_number):
         }
     )
 
-    fig = px.line(
-        plot_data,
-        x="question_number",
-        y="value",
-        facet_row="metric",
-        color="contestant",
-        height=1000,
-    )
-    dd_locations = dff[dff["is_dd"] == 1]["question_number"]
+    with timer("figure", "Win Probability.get_data"):
+        fig = px.line(
+            plot_data,
+            x="question_number",
+            y="value",
+            facet_row="metric",
+            color="contestant",
+            height=1000,
+        )
+        dd_locations = dff[dff["is_dd"] == 1]["question_number"]
 
-    for i in range(len(dd_locations)):
-        fig.add_vline(x=dd_locations.iloc[i], line_color="deeppink", line_dash="dash")
-    fig.update_yaxes(matches=None)
+        for i in range(len(dd_locations)):
+            fig.add_vline(
+                x=dd_locations.iloc[i], line_color="deeppink", line_dash="dash"
+            )
+        fig.update_yaxes(matches=None)
 
-    fig.update_layout(
-        title_text=f"Show Number {show_number} Scores and Win Probability <br><sup>Dashed pink lines indicate locations of the Daily Double</sup>"
-    )
-    fig.update_layout(hovermode="x unified")
-    fig.update_traces(mode="lines", hovertemplate=None)
+        fig.update_layout(
+            title_text=f"Show Number {show_number} Scores and Win Probability <br><sup>Dashed pink lines indicate locations of the Daily Double</sup>"
+        )
+        fig.update_layout(hovermode="x unified")
+        fig.update_traces(mode="lines", hovertemplate=None)
     return fig
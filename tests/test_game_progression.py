@@ -0,0 +1,246 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import JeopardyFunctions
+from JeopardyFunctions import GameBundle, as_clue_dtypes, game_columns
+from JeopardySynthetic import generate, schema_statements
+
+# Shows 7500 to 8099 air from 2013 to 2015, so with this seed the archive holds tied games (settled by a tiebreaker
+# clue from 2014 on) as well as games where one contestant's nickname is part of another's (Ann and Anna)
+first_show = 7500
+n_shows = 600
+seats = ["contestant_1", "contestant_2", "returning_champion"]
+
+
+def _columns(table):
+    statement = next(
+        s for s in schema_statements if s.startswith(f"CREATE TABLE {table} ")
+    )
+    body = statement[statement.index("(") + 1 : statement.rindex(")")]
+    return [column.split()[0] for column in body.split(",")]
+
+
+def _responders(text):
+    return [] if text is None else [name.strip() for name in text.split(",")]
+
+
+@pytest.fixture(scope="module")
+def archive():
+    tables = generate(n_shows, seed=2, first_show=first_show)
+    games = pd.DataFrame(tables["games_view"], columns=_columns("games_view"))
+    clues = pd.DataFrame(tables["clues_view"], columns=_columns("clues_view"))
+    return games.set_index("show_number", drop=False), clues
+
+
+def _bundle(game, clues):
+    # The clues_typed rows load_game returns, with the responders matched to seats by whole nickname like the
+    # clue-outcomes build step
+    nicknames = [game[f"{seat}_nickname"] for seat in seats]
+    typed = clues[["show_number", "round_id", "is_dd"]].copy()
+    typed["clue_value"] = clues["clue_value"].where(
+        clues["round_id"].isin(["J", "DJ"]), 0
+    )
+    typed["order_number"] = [
+        {"FJ": 61, "TB": 62}.get(round_id, order_number)
+        for round_id, order_number in zip(clues["round_id"], clues["order_number"])
+    ]
+    for column in ["correct", "incorrect"]:
+        typed[f"{column}_mask"] = [
+            sum(
+                bit
+                for bit, nickname in zip([1, 2, 4], nicknames)
+                if nickname in _responders(text)
+            )
+            for text in clues[f"{column}_contestants"]
+        ]
+    return GameBundle(
+        int(game["show_number"]), as_clue_dtypes(typed), game[game_columns]
+    )
+
+
+def reference_game_progression(game, clues):
+    """
+    The row by row implementation game_progression replaced, reading the show from DataFrames instead of the
+    database: nicknames are turned into seats by regex replacement of first names and the scores are grown with
+    np.vstack one clue at a time.
+    """
+    game_clues = clues[clues["round_id"].isin(["J", "DJ"])].copy()
+    game_clues["order_number"] = game_clues["order_number"].astype(int)
+    game_clues = game_clues.sort_values(
+        ["round_id", "order_number"], ascending=[False, True]
+    )
+    game_clues = game_clues[
+        [
+            "round_id",
+            "order_number",
+            "is_dd",
+            "clue_value",
+            "correct_contestants",
+            "incorrect_contestants",
+        ]
+    ].reset_index(drop=True)
+
+    name_data = pd.DataFrame(
+        [[game[f"{seat}_nickname"] for seat in seats]],
+        columns=[f"{seat}_nickname" for seat in seats],
+    ).melt()
+    name_data["variable"] = name_data["variable"].str.split("_n").str[0]
+    name_data["first_name"] = name_data["value"].str.split(" ").str[0]
+    rename_dict = dict(zip(name_data["first_name"], name_data["variable"]))
+
+    for column in ["correct_contestants", "incorrect_contestants"]:
+        game_clues[column] = (
+            game_clues[column].replace(rename_dict, regex=True).replace(np.nan, "")
+        )
+
+    starting_state = np.array([0, 0, 0, 0])
+    scores = [0, 0, 0]
+    correct_counts = [0, 0, 0]
+    incorrect_counts = [0, 0, 0]
+    question_number = 0
+    for index, row in game_clues.iterrows():
+        for position, seat in enumerate(seats):
+            if seat in row["correct_contestants"]:
+                scores[position] += row["clue_value"]
+                correct_counts[position] += 1
+        for position, seat in enumerate(seats):
+            if seat in row["incorrect_contestants"]:
+                scores[position] -= row["clue_value"]
+                incorrect_counts[position] += 1
+        question_number += 1
+        starting_state = np.vstack(
+            (starting_state, np.array([question_number, *scores]))
+        )
+
+    players = list(rename_dict.keys())
+    df = pd.DataFrame(starting_state)
+
+    daily_doubles = game_clues["is_dd"].to_numpy()
+    daily_doubles = pd.Series(np.insert(daily_doubles, 0, False)).map(
+        {True: 1, False: 0}
+    )
+
+    df = pd.concat([df, daily_doubles], axis=1)
+    df.columns = ["Question Number", players[0], players[1], players[2], "Daily Double"]
+
+    final_score = np.array([[game[f"{seat}_score"] for seat in seats]])
+    final_score = np.insert(final_score, 0, df["Question Number"].max() + 1)
+    final_score = pd.DataFrame(np.insert(final_score, 4, 0)).transpose()
+    final_score.columns = df.columns
+    df = pd.concat([df, final_score], axis=0).reset_index().drop(["index"], axis=1)
+
+    return df, correct_counts, incorrect_counts
+
+
+def _relabelled(game, clues):
+    # The same show with nicknames no regex can confuse, so the reference credits every response to the right seat
+    labels = dict(
+        zip([game[f"{seat}_nickname"] for seat in seats], ["Alpha", "Bravo", "Charlie"])
+    )
+    game = game.copy()
+    for seat in seats:
+        game[f"{seat}_nickname"] = labels[game[f"{seat}_nickname"]]
+    clues = clues.copy()
+    for column in ["correct_contestants", "incorrect_contestants"]:
+        clues[column] = [
+            (
+                None
+                if text is None
+                else ", ".join(labels[name] for name in _responders(text))
+            )
+            for text in clues[column]
+        ]
+    return (
+        game,
+        clues,
+        {label: nickname.split(" ")[0] for nickname, label in labels.items()},
+    )
+
+
+def _collides(game):
+    # A first name found inside another nickname, or inside a seat name the regex replacement writes into the
+    # responder lists
+    nicknames = [game[f"{seat}_nickname"] for seat in seats]
+    return any(
+        re.search(nickname.split(" ")[0], other)
+        for nickname in nicknames
+        for other in [*nicknames, *seats]
+        if other != nickname
+    )
+
+
+def _progression(monkeypatch, game, clues):
+    bundle = _bundle(game, clues)
+    monkeypatch.setattr(JeopardyFunctions, "load_game", lambda show_number: bundle)
+    return JeopardyFunctions.game_progression(bundle.show_number)
+
+
+def _assert_same(result, expected):
+    pd.testing.assert_frame_equal(result[0], expected[0], check_dtype=False)
+    assert result[1] == expected[1]
+    assert result[2] == expected[2]
+
+
+def _shows(archive):
+    games, clues = archive
+    for show_number, show_clues in clues.groupby("show_number"):
+        yield games.loc[show_number], show_clues
+
+
+def test_matches_reference_without_collisions(archive, monkeypatch):
+    compared = 0
+    for game, clues in _shows(archive):
+        if _collides(game):
+            continue
+        _assert_same(
+            _progression(monkeypatch, game, clues),
+            reference_game_progression(game, clues),
+        )
+        compared += 1
+    assert compared > n_shows // 2
+
+
+def test_nickname_collisions_credit_the_right_seat(archive, monkeypatch):
+    # The reference credits a response by Anna to Ann as well; seat masks match whole nicknames, so the result
+    # equals the reference run on unambiguous nicknames
+    collisions = differing = 0
+    for game, clues in _shows(archive):
+        if not _collides(game):
+            continue
+        result = _progression(monkeypatch, game, clues)
+        relabelled_game, relabelled_clues, nicknames = _relabelled(game, clues)
+        expected = reference_game_progression(relabelled_game, relabelled_clues)
+        expected[0].columns = [
+            nicknames.get(column, column) for column in expected[0].columns
+        ]
+        _assert_same(result, expected)
+
+        original = reference_game_progression(game, clues)
+        differing += not (result[1:] == original[1:] and result[0].equals(original[0]))
+        collisions += 1
+    assert collisions > 0 and differing > 0
+
+
+def test_tied_games_match_reference(archive, monkeypatch):
+    # Tied games end level on the final row, and from 2014 on hold a tiebreaker clue, which does not score
+    games, clues = archive
+    final_scores = np.sort(
+        games[[f"{seat}_score" for seat in seats]].to_numpy(), axis=1
+    )
+    tied = games[final_scores[:, -1] == final_scores[:, -2]]
+    assert (tied["winning_contestant"] == "Tied").any()
+    assert (clues[clues["show_number"].isin(tied.index)]["round_id"] == "TB").any()
+    for show_number, game in tied.iterrows():
+        show_clues = clues[clues["show_number"] == show_number]
+        relabelled_game, relabelled_clues, nicknames = _relabelled(game, show_clues)
+        expected = reference_game_progression(relabelled_game, relabelled_clues)
+        expected[0].columns = [
+            nicknames.get(column, column) for column in expected[0].columns
+        ]
+        result = _progression(monkeypatch, game, show_clues)
+        _assert_same(result, expected)
+        final = result[0].iloc[-1, 1:4].to_numpy()
+        assert final.max() == sorted(final)[-2]